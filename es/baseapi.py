@@ -1,13 +1,27 @@
 from collections import namedtuple
-from typing import Any, Dict, List, Optional, Tuple
+import hashlib
+import itertools
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
 from urllib import parse
+import weakref
 
 from elasticsearch import Elasticsearch
 from elasticsearch import exceptions as es_exceptions
+from elasticsearch.serializer import JSONSerializer
 from es import exceptions
 
 
-from .const import DEFAULT_FETCH_SIZE, DEFAULT_SCHEMA, DEFAULT_SQL_PATH
+from .const import (
+    DEFAULT_CLIENT_MAXSIZE,
+    DEFAULT_FETCH_SIZE,
+    DEFAULT_SCHEMA,
+    DEFAULT_SQL_PATH,
+)
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None  # type: ignore
 
 
 CursorDescriptionRow = namedtuple(
@@ -17,6 +31,48 @@ CursorDescriptionRow = namedtuple(
 
 CursorDescriptionType = List[CursorDescriptionRow]
 
+# Longest custom SQL command a cursor's `custom_sql_to_method` may map
+MAX_CUSTOM_SQL_LENGTH = 32
+
+# Dummy schema prefix stripped from queries by `BaseCursor.sanitize_query`
+_SCHEMA_PREFIX = f'FROM "{DEFAULT_SCHEMA}".'
+
+
+class ORJSONSerializer(JSONSerializer):
+    """
+    Elasticsearch JSON serializer backed by orjson, much faster
+    than the standard library json module on large responses.
+    What orjson rejects, like non string keys, integers over 64 bits
+    or NaN, goes through the standard serializer instead
+    """
+
+    def loads(self, s: Union[str, bytes]) -> Any:
+        try:
+            return orjson.loads(s)
+        except (ValueError, TypeError):
+            return super().loads(s if isinstance(s, str) else s.decode("utf-8"))
+
+    def dumps(self, data: Any) -> str:
+        # don't serialize strings
+        if isinstance(data, str):
+            return data
+        try:
+            return orjson.dumps(data, default=self.default).decode("utf-8")
+        except (ValueError, TypeError):
+            return super().dumps(data)
+
+
+# Elasticsearch constructor parameters used unless set on the connection
+DEFAULT_CLIENT_KWARGS: Dict[str, Any] = {"maxsize": DEFAULT_CLIENT_MAXSIZE}
+if orjson is not None:
+    DEFAULT_CLIENT_KWARGS["serializer"] = ORJSONSerializer()
+
+# Live Elasticsearch clients by url and parameters, so that connections to the
+# same cluster share the same transport and connection pool
+_es_clients: "weakref.WeakValueDictionary[Tuple[Any, ...], Elasticsearch]" = (
+    weakref.WeakValueDictionary()
+)
+
 
 class Type(object):
     STRING = 1
@@ -49,42 +105,91 @@ def check_result(f):
     return wrap
 
 
+# DBAPI types by Elasticsearch type
+_TYPE_MAP = {
+    "text": Type.STRING,
+    "keyword": Type.STRING,
+    "integer": Type.NUMBER,
+    "half_float": Type.NUMBER,
+    "scaled_float": Type.NUMBER,
+    "geo_point": Type.STRING,
+    # TODO get a solution for nested type
+    "nested": Type.STRING,
+    "object": Type.STRING,
+    "date": Type.DATETIME,
+    "datetime": Type.DATETIME,
+    "timestamp": Type.DATETIME,
+    "short": Type.NUMBER,
+    "long": Type.NUMBER,
+    "float": Type.NUMBER,
+    "double": Type.NUMBER,
+    "bytes": Type.NUMBER,
+    "boolean": Type.BOOLEAN,
+    "ip": Type.STRING,
+    "interval_minute_to_second": Type.STRING,
+    "interval_hour_to_second": Type.STRING,
+    "interval_hour_to_minute": Type.STRING,
+    "interval_day_to_second": Type.STRING,
+    "interval_day_to_minute": Type.STRING,
+    "interval_day_to_hour": Type.STRING,
+    "interval_year_to_month": Type.STRING,
+    "interval_second": Type.STRING,
+    "interval_minute": Type.STRING,
+    "interval_day": Type.STRING,
+    "interval_month": Type.STRING,
+    "interval_year": Type.STRING,
+    "time": Type.STRING,
+}
+
+
 def get_type(data_type) -> int:
-    type_map = {
-        "text": Type.STRING,
-        "keyword": Type.STRING,
-        "integer": Type.NUMBER,
-        "half_float": Type.NUMBER,
-        "scaled_float": Type.NUMBER,
-        "geo_point": Type.STRING,
-        # TODO get a solution for nested type
-        "nested": Type.STRING,
-        "object": Type.STRING,
-        "date": Type.DATETIME,
-        "datetime": Type.DATETIME,
-        "timestamp": Type.DATETIME,
-        "short": Type.NUMBER,
-        "long": Type.NUMBER,
-        "float": Type.NUMBER,
-        "double": Type.NUMBER,
-        "bytes": Type.NUMBER,
-        "boolean": Type.BOOLEAN,
-        "ip": Type.STRING,
-        "interval_minute_to_second": Type.STRING,
-        "interval_hour_to_second": Type.STRING,
-        "interval_hour_to_minute": Type.STRING,
-        "interval_day_to_second": Type.STRING,
-        "interval_day_to_minute": Type.STRING,
-        "interval_day_to_hour": Type.STRING,
-        "interval_year_to_month": Type.STRING,
-        "interval_second": Type.STRING,
-        "interval_minute": Type.STRING,
-        "interval_day": Type.STRING,
-        "interval_month": Type.STRING,
-        "interval_year": Type.STRING,
-        "time": Type.STRING,
-    }
-    return type_map[data_type.lower()]
+    return _TYPE_MAP[data_type.lower()]
+
+
+def get_es_client(
+    url: str,
+    credentials: Optional[Tuple[Any, ...]] = None,
+    auth_factory: Optional[Callable[..., Any]] = None,
+    **kwargs: Any,
+) -> Elasticsearch:
+    """
+    Returns an Elasticsearch client for the url and parameters, reusing
+    a live client already created with the same ones
+
+    :param url: The connection URL
+    :param credentials: Authentication credentials, clients are looked up
+        by a hash of them so they are not kept around in the clear
+    :param auth_factory: Builds the `http_auth` parameter from the credentials
+        when a new client is needed, defaults to passing the credentials as is
+    :param kwargs: Elasticsearch constructor parameters
+    """
+    kwargs = {**DEFAULT_CLIENT_KWARGS, **kwargs}
+    credentials_hash = None
+    if credentials is not None:
+        credentials_hash = hashlib.sha256(repr(credentials).encode()).hexdigest()
+    key = (
+        url,
+        credentials_hash,
+        tuple(sorted((name, repr(value)) for name, value in kwargs.items())),
+    )
+    client = _es_clients.get(key)
+    if client is None:
+        if credentials is not None:
+            kwargs["http_auth"] = (
+                auth_factory(*credentials) if auth_factory else credentials
+            )
+        client = Elasticsearch(url, **kwargs)
+        _es_clients[key] = client
+    return client
+
+
+def reset_es_clients() -> None:
+    """
+    Forgets the shared Elasticsearch clients, and the authentication they
+    were created with, following connections create new ones.
+    Connections already open keep their client
+    """
+    _es_clients.clear()
 
 
 def get_description_from_columns(
@@ -110,6 +215,8 @@ class BaseConnection(object):
 
     """Connection to an ES Cluster"""
 
+    __slots__ = ("url", "context", "closed", "cursors", "kwargs", "es", "__weakref__")
+
     def __init__(
         self,
         host: str = "localhost",
@@ -169,6 +276,20 @@ class BaseConnection(object):
 class BaseCursor:
     """Connection cursor."""
 
+    __slots__ = (
+        "url",
+        "es",
+        "sql_path",
+        "fetch_size",
+        "time_zone",
+        "arraysize",
+        "closed",
+        "description",
+        "_results",
+        "_rowcount",
+        "__weakref__",
+    )
+
     custom_sql_to_method: Dict[str, str] = {}
     """
     Each child implements custom SQL commands so that we can
@@ -203,7 +324,19 @@ class BaseCursor:
         self.description: CursorDescriptionType = []
 
         # this is set to an iterator after a successful query
-        self._results: List[Tuple[Any, ...]] = []
+        self._results: Iterator[Tuple[Any, ...]] = iter(())
+        self._rowcount = 0
+
+    def _set_results(self, rows: Iterable[Tuple[Any, ...]], rowcount: int) -> None:
+        """
+        Sets the rows of the last query, the fetch methods consume them
+        so they can be built lazily
+
+        :param rows: The result rows
+        :param rowcount: The number of result rows
+        """
+        self._results = iter(rows)
+        self._rowcount = rowcount
 
     def custom_sql_to_method_dispatcher(self, command: str) -> Optional["BaseCursor"]:
         """
@@ -211,6 +344,9 @@ class BaseCursor:
         :param command: str
         :return: None if no command found, or a Cursor with the result
         """
+        # Custom commands are short, don't lowercase whole queries
+        if len(command) > MAX_CUSTOM_SQL_LENGTH:
+            return None
         method_name = self.custom_sql_to_method.get(command.lower())
         return getattr(self, method_name)() if method_name else None
 
@@ -219,9 +355,7 @@ class BaseCursor:
     @check_closed
     def rowcount(self) -> int:
         """Counts the number of rows on a result"""
-        if self._results:
-            return len(self._results)
-        return 0
+        return self._rowcount
 
     @check_closed
     def close(self) -> None:
@@ -246,10 +380,7 @@ class BaseCursor:
         Fetch the next row of a query result set, returning a single sequence,
         or `None` when no more data is available.
         """
-        try:
-            return self._results.pop(0)
-        except IndexError:
-            return None
+        return next(self._results, None)
 
     @check_result
     @check_closed
@@ -260,8 +391,7 @@ class BaseCursor:
         no more rows are available.
         """
         size = size or self.arraysize
-        output, self._results = self._results[:size], self._results[size:]
-        return output
+        return list(itertools.islice(self._results, size))
 
     @check_result
     @check_closed
@@ -271,7 +401,7 @@ class BaseCursor:
         sequence of sequences (e.g. a list of tuples). Note that the cursor's
         arraysize attribute can affect the performance of this operation.
         """
-        return list(self)
+        return list(self._results)
 
     @check_closed
     def setinputsizes(self, sizes):  # pragma: no cover
@@ -300,7 +430,7 @@ class BaseCursor:
         """
         Removes dummy schema from queries
         """
-        return query.replace(f'FROM "{DEFAULT_SCHEMA}".', "FROM ")
+        return query.replace(_SCHEMA_PREFIX, "FROM ")
 
     def elastic_query(self, query: str) -> Dict[str, Any]:
         """
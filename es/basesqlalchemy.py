@@ -3,9 +3,13 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import copy
+import functools
 import logging
-from typing import Any, List, Type
+import time
+from typing import Any, Callable, Collection, Dict, List, Optional, Tuple, Type
 
+from elasticsearch.exceptions import TransportError
 import es
 from es import exceptions
 from es.const import DEFAULT_SCHEMA
@@ -26,6 +30,39 @@ def parse_bool_argument(value: str) -> bool:
         raise ValueError(f"Expected boolean found {value}")
 
 
+def reflection_cache(fn: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    Caches dialect reflection methods results for `reflection_cache_ttl`
+    seconds, keyed by method name and arguments (excluding the connection)
+    """
+
+    @functools.wraps(fn)
+    def wrap(self, connection, *args, **kwargs):
+        key = (
+            fn.__name__,
+            args,
+            tuple((k, v) for k, v in kwargs.items() if k != "info_cache"),
+        )
+        now = time.monotonic()
+        ttl = self.reflection_cache_ttl
+        cache = self._reflection_cache
+        cached = cache.get(key)
+        if cached is None or now - cached[0] >= ttl:
+            cached = (now, fn(self, connection, *args, **kwargs))
+            # Entries are kept oldest first, drop the expired ones
+            cache.pop(key, None)
+            while cache:
+                oldest_key = next(iter(cache))
+                if now - cache[oldest_key][0] < ttl:
+                    break
+                cache.pop(oldest_key, None)
+            cache[key] = cached
+        # Callers may change the returned structures, never hand out the cached ones
+        return copy.deepcopy(cached[1])
+
+    return wrap
+
+
 class BaseESCompiler(compiler.SQLCompiler):
     def visit_fromclause(self, fromclause: str, **kwargs: Any):
         return fromclause.replace("default.", "")
@@ -87,6 +124,8 @@ class BaseESDialect(default.DefaultDialect):
     name = "SET"
     scheme = "SET"
     driver = "SET"
+    supports_statement_cache = True
+    default_paramstyle = "pyformat"
     statement_compiler: Type[BaseESCompiler] = BaseESCompiler
     type_compiler: Type[BaseESTypeCompiler] = BaseESTypeCompiler
     preparer = compiler.IdentifierPreparer
@@ -101,7 +140,25 @@ class BaseESDialect(default.DefaultDialect):
     supports_native_boolean = True
     supports_simple_order_by_label = True
 
-    _not_supported_column_types = ["object", "nested"]
+    _not_supported_column_types: Collection[str] = frozenset(("object", "nested"))
+
+    # Seconds reflection results (tables, views and columns) are reused for
+    reflection_cache_ttl: float = 60
+
+    def __init__(
+        self, reflection_cache_ttl: Optional[float] = None, **kwargs: Any
+    ) -> None:
+        super().__init__(**kwargs)
+        if reflection_cache_ttl is not None:
+            self.reflection_cache_ttl = float(reflection_cache_ttl)
+        self._reflection_cache: Dict[Tuple[Any, ...], Tuple[float, Any]] = {}
+
+    def reset_reflection_cache(self) -> None:
+        """
+        Drops cached reflection results, the next reflection calls
+        will query the cluster, for example after creating an index
+        """
+        self._reflection_cache.clear()
 
     _map_parse_connection_parameters = {
         "verify_certs": parse_bool_argument,
@@ -130,12 +187,11 @@ class BaseESDialect(default.DefaultDialect):
             "user": url.username or None,
             "password": url.password or None,
         }
-        if url.query:
-            kwargs.update(url.query)
-
-        for name, parse_func in self._map_parse_connection_parameters.items():
-            if name in kwargs:
-                kwargs[name] = parse_func(url.query[name])
+        parse_funcs = self._map_parse_connection_parameters
+        # Only the given parameters are looked up, most URIs have few or none
+        for name, value in url.query.items():
+            parse_func = parse_funcs.get(name)
+            kwargs[name] = parse_func(value) if parse_func else value
 
         return ([], kwargs)
 
@@ -144,6 +200,12 @@ class BaseESDialect(default.DefaultDialect):
         return [DEFAULT_SCHEMA]
 
     def has_table(self, connection, table_name, schema=None):
+        # A HEAD request rules out missing indices without listing all tables
+        try:
+            if not connection.connection.es.indices.exists(index=table_name):
+                return False
+        except TransportError:
+            pass
         return table_name in self.get_table_names(connection, schema)
 
     def get_table_names(self, connection, schema=None, **kwargs) -> List[str]:
@@ -182,6 +244,15 @@ class BaseESDialect(default.DefaultDialect):
     def do_rollback(self, dbapi_connection):
         pass
 
+    def do_ping(self, dbapi_connection) -> bool:
+        # A HEAD request on the cluster root, cheaper than a SQL SELECT 1
+        # False has the pool invalidate the connection and reconnect
+        try:
+            return bool(dbapi_connection.es.ping())
+        except TransportError:
+            # ConnectionError is a TransportError too
+            return False
+
     def _check_unicode_returns(self, connection, additional_tests=None):
         return True
 
@@ -189,27 +260,30 @@ class BaseESDialect(default.DefaultDialect):
         return True
 
 
+# SQLAlchemy types by Elasticsearch type
+_TYPE_MAP = {
+    "bytes": types.LargeBinary,
+    "boolean": types.Boolean,
+    "date": types.DateTime,
+    "datetime": types.DateTime,
+    "double": types.Numeric,
+    "text": types.String,
+    "keyword": types.String,
+    "integer": types.Integer,
+    "half_float": types.Float,
+    "geo_point": types.String,
+    # TODO get a solution for nested type
+    "nested": types.String,
+    # TODO get a solution for object
+    "object": types.BLOB,
+    "long": types.BigInteger,
+    "float": types.Float,
+    "ip": types.String,
+}
+
+
 def get_type(data_type: str) -> int:
-    type_map = {
-        "bytes": types.LargeBinary,
-        "boolean": types.Boolean,
-        "date": types.DateTime,
-        "datetime": types.DateTime,
-        "double": types.Numeric,
-        "text": types.String,
-        "keyword": types.String,
-        "integer": types.Integer,
-        "half_float": types.Float,
-        "geo_point": types.String,
-        # TODO get a solution for nested type
-        "nested": types.String,
-        # TODO get a solution for object
-        "object": types.BLOB,
-        "long": types.BigInteger,
-        "float": types.Float,
-        "ip": types.String,
-    }
-    type_ = type_map.get(data_type)
+    type_ = _TYPE_MAP.get(data_type)
     if not type_:
         logger.warning(f"Unknown type found {data_type} reverting to string")
         type_ = types.String
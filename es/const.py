@@ -1,3 +1,5 @@
 DEFAULT_SCHEMA = "default"
 DEFAULT_SQL_PATH = "_sql"
 DEFAULT_FETCH_SIZE = 10000
+DEFAULT_COLUMNS_CACHE_TTL = 60
+DEFAULT_CLIENT_MAXSIZE = 25
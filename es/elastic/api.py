@@ -1,4 +1,6 @@
+import functools
 import re
+import time
 from typing import Any, Dict, List, Optional, Tuple
 
 from elasticsearch import Elasticsearch, exceptions as es_exceptions
@@ -10,10 +12,49 @@ from es.baseapi import (
     check_closed,
     CursorDescriptionRow,
     get_description_from_columns,
+    get_es_client,
     Type,
 )
+from es.const import DEFAULT_COLUMNS_CACHE_TTL
 from packaging import version
 
+_SHOW_ARRAY_COLUMNS = "SHOW ARRAY_COLUMNS FROM "
+_SHOW_ARRAY_COLUMNS_RE = re.compile(_SHOW_ARRAY_COLUMNS + "(.*)")
+
+# Description of SHOW ARRAY_COLUMNS results, it never changes
+_ARRAY_COLUMNS_DESCRIPTION = [
+    CursorDescriptionRow("name", Type.STRING, None, None, None, None, None)
+]
+
+# Most indexes searched by a single `Cursor.get_all_array_columns` request
+_MAX_ARRAY_COLUMNS_PREFETCH = 100
+
+# Array columns by index name, with the time they were fetched
+ArrayColumnsCacheType = Dict[str, Tuple[float, List[Tuple[str]]]]
+
+
+def _get_array_columns(source: Dict[str, Any]) -> List[Tuple[str]]:
+    """
+    Returns the array type columns of a document
+
+    :param source: The document source
+    :return: A list of array column names, and their keyword fields
+    """
+    array_columns: List[Tuple[str]] = []
+    for col_name, value in source.items():
+        # If it's a list (ES Array add to cursor)
+        if isinstance(value, list):
+            if len(value) > 0:
+                # If it's an array of objects add all keys
+                if isinstance(value[0], dict):
+                    for in_col_name in value[0]:
+                        array_columns.append((f"{col_name}.{in_col_name}",))
+                        array_columns.append((f"{col_name}.{in_col_name}.keyword",))
+                    continue
+            array_columns.append((col_name,))
+            array_columns.append((f"{col_name}.keyword",))
+    return array_columns
+
 
 def connect(
     host: str = "localhost",
@@ -40,6 +81,8 @@ class Connection(BaseConnection):
 
     """Connection to an ES Cluster"""
 
+    __slots__ = ("_cursor_factory", "_array_columns_cache", "_listed_table_names")
+
     def __init__(
         self,
         host: str = "localhost",
@@ -62,15 +105,37 @@ class Connection(BaseConnection):
             **kwargs,
         )
         if user and password:
-            self.es = Elasticsearch(self.url, http_auth=(user, password), **self.kwargs)
+            self.es = get_es_client(
+                self.url, credentials=(user, password), **self.kwargs
+            )
         else:
-            self.es = Elasticsearch(self.url, **self.kwargs)
+            self.es = get_es_client(self.url, **self.kwargs)
+        # Cursors share the connection's array columns cache, and the table
+        # names last listed, reflected next
+        self._array_columns_cache: ArrayColumnsCacheType = {}
+        self._listed_table_names: List[str] = []
+        # Cursors share the same construction arguments, bind them once
+        self._cursor_factory = functools.partial(
+            Cursor,
+            self.url,
+            self.es,
+            array_columns_cache=self._array_columns_cache,
+            listed_table_names=self._listed_table_names,
+            **self.kwargs,
+        )
+
+    @check_closed
+    def close(self) -> None:
+        """Close the connection now, and drop cached array columns."""
+        self._array_columns_cache.clear()
+        self._listed_table_names.clear()
+        super().close()
 
     @check_closed
     def cursor(self) -> BaseCursor:
         """Return a new Cursor Object using the connection."""
         if self.es:
-            cursor = Cursor(self.url, self.es, **self.kwargs)
+            cursor = self._cursor_factory()
             self.cursors.append(cursor)
             return cursor
         raise exceptions.UnexpectedESInitError()
@@ -80,14 +145,33 @@ class Cursor(BaseCursor):
 
     """Connection cursor."""
 
+    __slots__ = ("array_columns_cache", "listed_table_names", "columns_cache_ttl")
+
     custom_sql_to_method = {
         "show valid_tables": "get_valid_table_names",
         "show valid_views": "get_valid_view_names",
     }
 
-    def __init__(self, url: str, es: Elasticsearch, **kwargs: Any) -> None:
+    def __init__(
+        self,
+        url: str,
+        es: Elasticsearch,
+        array_columns_cache: Optional[ArrayColumnsCacheType] = None,
+        listed_table_names: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> None:
         super().__init__(url, es, **kwargs)
         self.sql_path = kwargs.get("sql_path") or "_sql"
+        # Array columns used by SHOW ARRAY_COLUMNS, reused for a while
+        self.array_columns_cache = (
+            array_columns_cache if array_columns_cache is not None else {}
+        )
+        self.listed_table_names = (
+            listed_table_names if listed_table_names is not None else []
+        )
+        self.columns_cache_ttl = float(
+            kwargs.get("columns_cache_ttl", DEFAULT_COLUMNS_CACHE_TTL)
+        )
 
     def _get_value_for_col_name(self, row: Tuple[Any], name: str) -> Any:
         """
@@ -112,25 +196,91 @@ class Cursor(BaseCursor):
         :param: type_filter will filter SHOW_TABLES result by BASE_TABLE or VIEW
         """
         results = self.execute("SHOW TABLES")
-        response = self.es.cat.indices(format="json")
-
-        _results = []
-        for result in results:
-            is_empty = False
-            for item in response:
-                # First column is TABLE_NAME
-                if item["index"] == self._get_value_for_col_name(result, "name"):
-                    if int(item["docs.count"]) == 0:
-                        is_empty = True
-                        break
-            if (
-                not is_empty
-                and self._get_value_for_col_name(result, "type") == type_filter
-            ):
-                _results.append(result)
-        self._results = _results
+        # Only the columns needed to find empty indices
+        response = self.es.cat.indices(format="json", h="index,docs.count")
+        # docs.count is returned as a string, no need to parse it
+        empty_indices = {
+            item["index"] for item in response if item["docs.count"] == "0"
+        }
+
+        # Cheap type check first, most rows are discarded by it
+        _results = [
+            result
+            for result in results
+            if self._get_value_for_col_name(result, "type") == type_filter
+            and self._get_value_for_col_name(result, "name") not in empty_indices
+        ]
+        self._set_results(_results, len(_results))
+        if type_filter != "VIEW":
+            # Reflection may follow up with SHOW ARRAY_COLUMNS for each table,
+            # remember them to batch those, listing alone sends nothing more
+            self.listed_table_names[:] = [
+                self._get_value_for_col_name(result, "name") for result in _results
+            ]
         return self
 
+    def _get_cached_array_columns(
+        self, index_name: str, now: float
+    ) -> Optional[List[Tuple[str]]]:
+        cached = self.array_columns_cache.get(index_name)
+        if cached is None or now - cached[0] >= self.columns_cache_ttl:
+            return None
+        return cached[1]
+
+    def _prefetch_array_columns(self, table_name: str, now: float) -> None:
+        """
+        On the first SHOW ARRAY_COLUMNS of a listed table, fetches the array
+        columns of the next listed tables too, up to `_MAX_ARRAY_COLUMNS_PREFETCH`
+
+        :param table_name: The table SHOW ARRAY_COLUMNS was called for
+        :param now: The current monotonic time
+        """
+        listed_table_names = self.listed_table_names
+        try:
+            idx = listed_table_names.index(table_name)
+        except ValueError:
+            return
+        # Reflection goes through tables in listing order, start with the next ones
+        following = listed_table_names[idx:] + listed_table_names[:idx]
+        index_names = [table_name]
+        for index_name in following[1:]:
+            if len(index_names) >= _MAX_ARRAY_COLUMNS_PREFETCH:
+                break
+            if self._get_cached_array_columns(index_name, now) is None:
+                index_names.append(index_name)
+        # A single table is left to a plain search
+        if len(index_names) > 1:
+            self.get_all_array_columns(index_names)
+
+    def get_all_array_columns(self, index_names: List[str]) -> None:
+        """
+        Fetches one document of each index with a single multi search and
+        caches their array type columns, so that following
+        "SHOW ARRAY_COLUMNS FROM <INDEX>" don't need a request each.
+        This is just an optimization, errors are ignored
+
+        :param index_names: The indexes to cache array columns for
+        """
+        if not index_names:
+            return
+        body: List[Dict[str, Any]] = []
+        for index_name in index_names:
+            body.append({"index": index_name})
+            # One document is enough, and no need to count the hits
+            body.append({"size": 1, "track_total_hits": False})
+        try:
+            response = self.es.msearch(body=body)
+        except es_exceptions.TransportError:
+            return
+        now = time.monotonic()
+        for index_name, index_response in zip(index_names, response["responses"]):
+            hits = index_response.get("hits", {}).get("hits")
+            if hits is None or hits and "_source" not in hits[0]:
+                # Leave failed searches to SHOW ARRAY_COLUMNS
+                continue
+            source = hits[0]["_source"] if hits else {}
+            self.array_columns_cache[index_name] = (now, _get_array_columns(source))
+
     def get_valid_table_names(self) -> "Cursor":
         # Get the ES cluster version. Since 7.10 the table column name changed #52
         cluster_info = self.es.info()
@@ -150,20 +300,23 @@ class Cursor(BaseCursor):
         if cursor:
             return cursor
 
-        re_table_name = re.match("SHOW ARRAY_COLUMNS FROM (.*)", operation)
-        if re_table_name:
-            return self.get_array_type_columns(re_table_name[1])
+        # Plain queries skip the regex altogether
+        if operation.startswith(_SHOW_ARRAY_COLUMNS):
+            re_table_name = _SHOW_ARRAY_COLUMNS_RE.match(operation)
+            if re_table_name:
+                return self.get_array_type_columns(re_table_name[1])
 
         query = apply_parameters(operation, parameters)
         results = self.elastic_query(query)
         # We need a list of tuples
-        rows = [tuple(row) for row in results.get("rows", [])]
+        rows = results.get("rows") or ()
         columns = results.get("columns")
         if not columns:
             raise exceptions.DataError(
                 "Missing columns field, maybe it's an opendistro sql ep"
             )
-        self._results = rows
+        # Rows are converted to tuples as they are fetched
+        self._set_results(map(tuple, rows), len(rows))
         self.description = get_description_from_columns(columns)
         return self
 
@@ -173,40 +326,31 @@ class Cursor(BaseCursor):
         and return a list of array type columns.
         This is useful since arrays are not supported by ES SQL
         """
-        array_columns: List[Tuple[Any, ...]] = []
-        try:
-            response = self.es.search(index=table_name, size=1)
-        except es_exceptions.ConnectionError as e:
-            raise exceptions.OperationalError(
-                f"Error connecting to {self.url}: {e.info}"
-            )
-        except es_exceptions.NotFoundError as e:
-            raise exceptions.ProgrammingError(f"Error ({e.error}): {e.info}")
-        try:
-            if response["hits"]["total"]["value"] == 0:
-                source = {}
-            else:
-                source = response["hits"]["hits"][0]["_source"]
-        except KeyError as e:
-            raise exceptions.DataError(
-                f"Error inferring array type columns {self.url}: {e}"
-            )
-        for col_name, value in source.items():
-            # If it's a list (ES Array add to cursor)
-            if isinstance(value, list):
-                if len(value) > 0:
-                    # If it's an array of objects add all keys
-                    if isinstance(value[0], dict):
-                        for in_col_name in value[0]:
-                            array_columns.append((f"{col_name}.{in_col_name}",))
-                            array_columns.append((f"{col_name}.{in_col_name}.keyword",))
-                        continue
-                array_columns.append((col_name,))
-                array_columns.append((f"{col_name}.keyword",))
-        if not array_columns:
-            array_columns = []
-        self.description = [
-            CursorDescriptionRow("name", Type.STRING, None, None, None, None, None)
-        ]
-        self._results = array_columns
+        now = time.monotonic()
+        array_columns = self._get_cached_array_columns(table_name, now)
+        if array_columns is None:
+            self._prefetch_array_columns(table_name, now)
+            array_columns = self._get_cached_array_columns(table_name, now)
+        if array_columns is None:
+            try:
+                response = self.es.search(index=table_name, size=1)
+            except es_exceptions.ConnectionError as e:
+                raise exceptions.OperationalError(
+                    f"Error connecting to {self.url}: {e.info}"
+                )
+            except es_exceptions.NotFoundError as e:
+                raise exceptions.ProgrammingError(f"Error ({e.error}): {e.info}")
+            try:
+                if response["hits"]["total"]["value"] == 0:
+                    source = {}
+                else:
+                    source = response["hits"]["hits"][0]["_source"]
+            except KeyError as e:
+                raise exceptions.DataError(
+                    f"Error inferring array type columns {self.url}: {e}"
+                )
+            array_columns = _get_array_columns(source)
+            self.array_columns_cache[table_name] = (now, array_columns)
+        self.description = _ARRAY_COLUMNS_DESCRIPTION
+        self._set_results(array_columns, len(array_columns))
         return self
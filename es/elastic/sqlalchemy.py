@@ -22,6 +22,7 @@ class ESDialect(basesqlalchemy.BaseESDialect):
     name = "elasticsearch"
     scheme = "http"
     driver = "rest"
+    supports_statement_cache = True
     statement_compiler = ESCompiler
     type_compiler = ESTypeCompiler
 
@@ -29,6 +30,7 @@ class ESDialect(basesqlalchemy.BaseESDialect):
     def dbapi(cls) -> ModuleType:
         return es.elastic
 
+    @basesqlalchemy.reflection_cache
     def get_table_names(
         self, connection: Connection, schema: Optional[str] = None, **kwargs: Any
     ) -> List[str]:
@@ -37,6 +39,7 @@ class ESDialect(basesqlalchemy.BaseESDialect):
         # return a list of table names exclude hidden and empty indexes
         return [table.name for table in result if table.name[0] != "."]
 
+    @basesqlalchemy.reflection_cache
     def get_view_names(
         self, connection: Connection, schema: Optional[str] = None, **kwargs: Any
     ) -> List[str]:
@@ -45,6 +48,7 @@ class ESDialect(basesqlalchemy.BaseESDialect):
         # return a list of view names (ES aliases) exclude hidden and empty indexes
         return [table.name for table in result if table.name[0] != "."]
 
+    @basesqlalchemy.reflection_cache
     def get_columns(
         self,
         connection: Connection,
@@ -57,24 +61,29 @@ class ESDialect(basesqlalchemy.BaseESDialect):
         array_columns_ = connection.execute(
             f"SHOW ARRAY_COLUMNS FROM {table_name}"
         ).fetchall()
-        # convert cursor rows: List[Tuple[str]] to List[str]
-        if not array_columns_:
-            array_columns = []
-        else:
-            array_columns = [col_name.name for col_name in array_columns_]
+        # convert cursor rows: List[Tuple[str]] to Set[str]
+        array_columns = {col_name.name for col_name in array_columns_}
 
         all_columns = connection.execute(query)
-        return [
-            {
-                "name": row.column,
-                "type": basesqlalchemy.get_type(row.mapping),
-                "nullable": True,
-                "default": None,
-            }
-            for row in all_columns
-            if row.mapping not in self._not_supported_column_types
-            and row.column not in array_columns
-        ]
+        get_type = basesqlalchemy.get_type
+        not_supported_column_types = self._not_supported_column_types
+        columns = []
+        for row in all_columns:
+            type_name = row.mapping
+            if type_name in not_supported_column_types:
+                continue
+            column_name = row.column
+            if column_name in array_columns:
+                continue
+            columns.append(
+                {
+                    "name": column_name,
+                    "type": get_type(type_name),
+                    "nullable": True,
+                    "default": None,
+                }
+            )
+        return columns
 
 
 ESHTTPDialect = ESDialect
@@ -83,4 +92,4 @@ ESHTTPDialect = ESDialect
 class ESHTTPSDialect(ESDialect):
 
     scheme = "https"
-    default_paramstyle = "pyformat"
+    supports_statement_cache = True
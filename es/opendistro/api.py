@@ -3,11 +3,13 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import functools
 import re
-from typing import Any, Dict, List, Optional, Tuple
+import time
+from typing import Any, Dict, List, Match, Optional, Tuple
 
 from elasticsearch import Elasticsearch, RequestsHttpConnection
-from elasticsearch.exceptions import ConnectionError
+from elasticsearch.exceptions import ConnectionError, TransportError
 from es import exceptions
 from es.baseapi import (
     apply_parameters,
@@ -15,8 +17,62 @@ from es.baseapi import (
     BaseCursor,
     check_closed,
     get_description_from_columns,
+    get_es_client,
 )
-from es.const import DEFAULT_SCHEMA
+from es.const import DEFAULT_COLUMNS_CACHE_TTL, DEFAULT_SCHEMA
+
+# `Cursor.sanitize_query` removes double quotes, then replaces new lines and
+# double spaces by one space and drops the dummy schema in a single pass. The
+# schema is dropped when what separates it from FROM collapses to one space
+_SANITIZE_TRANS = str.maketrans("", "", '"')
+_SANITIZE_RE = re.compile(rf"FROM(?: {{1,2}}|\n){re.escape(DEFAULT_SCHEMA)}\.|  |\n")
+
+_SHOW_VALID_COLUMNS = "SHOW VALID_COLUMNS FROM "
+_SHOW_VALID_COLUMNS_RE = re.compile(_SHOW_VALID_COLUMNS + "(.*)")
+
+# Descriptions of custom SQL commands results, these never change
+_VIEW_NAMES_DESCRIPTION = get_description_from_columns(
+    [{"name": "VIEW_NAME", "type": "text"}, {"name": "TABLE_NAME", "type": "text"}]
+)
+_COLUMNS_DESCRIPTION = get_description_from_columns(
+    [{"name": "COLUMN_NAME", "type": "text"}, {"name": "TYPE_NAME", "type": "text"}]
+)
+_SELECT_ONE_DESCRIPTION = get_description_from_columns([{"name": "1", "type": "long"}])
+
+# Most indexes, and longest comma separated index list, prefetched at once
+_MAX_MAPPINGS_PREFETCH = 100
+_MAX_MAPPINGS_INDEXES_LENGTH = 2048
+
+# Flattened index mappings by index name, with the time they were fetched
+ColumnsCacheType = Dict[str, Tuple[float, List[Tuple[str, ...]]]]
+
+
+def _merge_properties(
+    properties: Dict[str, Any], other_properties: Dict[str, Any]
+) -> Dict[str, Any]:
+    """
+    Merges mapping properties into another, fields of object fields
+    present on both are merged too
+
+    :param properties: The mapping properties to update
+    :param other_properties: The mapping properties to merge in
+    :return: The updated mapping properties
+    """
+    for field_name, metadata in other_properties.items():
+        current = properties.get(field_name)
+        if current and "properties" in current and "properties" in metadata:
+            metadata = {
+                **current,
+                "properties": _merge_properties(
+                    dict(current["properties"]), metadata["properties"]
+                ),
+            }
+        properties[field_name] = metadata
+    return properties
+
+
+def _sanitize_sub(match: Match[str]) -> str:
+    return "FROM " if match[0][0] == "F" else " "
 
 
 def connect(
@@ -44,6 +100,8 @@ class Connection(BaseConnection):
 
     """Connection to an ES Cluster"""
 
+    __slots__ = ("_cursor_factory", "_columns_cache", "_listed_table_names")
+
     def __init__(
         self,
         host: str = "localhost",
@@ -55,6 +113,10 @@ class Connection(BaseConnection):
         context: Optional[Dict[Any, Any]] = None,
         **kwargs: Any,
     ):
+        # AWS authentication parameters are not Elasticsearch parameters
+        aws_keys = kwargs.pop("aws_keys", None)
+        aws_region = kwargs.pop("aws_region", None)
+        aws_profile = kwargs.pop("aws_profile", None)
         super().__init__(
             host=host,
             port=port,
@@ -65,58 +127,87 @@ class Connection(BaseConnection):
             context=context,
             **kwargs,
         )
-        if user and password and "aws_keys" not in kwargs:
-            self.es = Elasticsearch(self.url, http_auth=(user, password), **self.kwargs)
+        if user and password and aws_keys is None:
+            self.es = get_es_client(
+                self.url, credentials=(user, password), **self.kwargs
+            )
         # AWS configured credentials on the connection string
-        elif user and password and "aws_keys" in kwargs and "aws_region" in kwargs:
-            aws_auth = self._aws_auth(user, password, kwargs["aws_region"])
-            kwargs.pop("aws_keys")
-            kwargs.pop("aws_region")
-
-            self.es = Elasticsearch(
+        elif user and password and aws_region is not None:
+            self.es = get_es_client(
                 self.url,
-                http_auth=aws_auth,
+                credentials=(user, password, aws_region),
+                auth_factory=self._aws_auth,
                 connection_class=RequestsHttpConnection,
-                **kwargs,
+                **self.kwargs,
             )
         # aws_profile=<region>
-        elif "aws_profile" in kwargs:
-            aws_auth = self._aws_auth_profile(kwargs["aws_profile"])
-            self.es = Elasticsearch(
+        elif aws_profile is not None:
+            self.es = get_es_client(
                 self.url,
-                http_auth=aws_auth,
+                credentials=self._aws_profile_credentials(aws_profile),
+                auth_factory=self._aws_auth,
                 connection_class=RequestsHttpConnection,
-                **kwargs,
+                **self.kwargs,
             )
         else:
-            self.es = Elasticsearch(self.url, **self.kwargs)
+            self.es = get_es_client(self.url, **self.kwargs)
+        # Cursors share the connection's columns cache
+        self._columns_cache: ColumnsCacheType = {}
+        # And the last listed tables, to prefetch their columns
+        self._listed_table_names: List[str] = []
+        # Cursors share the same construction arguments, bind them once
+        self._cursor_factory = functools.partial(
+            Cursor,
+            self.url,
+            self.es,
+            columns_cache=self._columns_cache,
+            listed_table_names=self._listed_table_names,
+            **self.kwargs,
+        )
 
     @staticmethod
-    def _aws_auth_profile(region: str) -> Any:
-        from requests_aws4auth import AWS4Auth
+    def _aws_profile_credentials(region: str) -> Tuple[str, str, str, Optional[str]]:
         import boto3
 
-        service = "es"
         credentials = boto3.Session().get_credentials()
-        return AWS4Auth(
+        return (
             credentials.access_key,
             credentials.secret_key,
             region,
-            service,
-            session_token=credentials.token,
+            credentials.token,
         )
 
     @staticmethod
-    def _aws_auth(aws_access_key: str, aws_secret_key: str, region: str) -> Any:
+    def _aws_auth(
+        aws_access_key: str,
+        aws_secret_key: str,
+        region: str,
+        session_token: Optional[str] = None,
+    ) -> Any:
         from requests_aws4auth import AWS4Auth
 
-        return AWS4Auth(aws_access_key, aws_secret_key, region, "es")
+        if session_token is None:
+            return AWS4Auth(aws_access_key, aws_secret_key, region, "es")
+        return AWS4Auth(
+            aws_access_key,
+            aws_secret_key,
+            region,
+            "es",
+            session_token=session_token,
+        )
+
+    @check_closed
+    def close(self) -> None:
+        """Close the connection now, and drop cached columns."""
+        self._columns_cache.clear()
+        self._listed_table_names.clear()
+        super().close()
 
     @check_closed
     def cursor(self) -> "Cursor":
         """Return a new Cursor Object using the connection."""
         if self.es:
-            cursor = Cursor(self.url, self.es, **self.kwargs)
+            cursor = self._cursor_factory()
             self.cursors.append(cursor)
             return cursor
         raise exceptions.UnexpectedESInitError()
@@ -124,19 +215,37 @@ class Connection(BaseConnection):
 
 class Cursor(BaseCursor):
 
+    __slots__ = ("v2", "columns_cache", "listed_table_names", "columns_cache_ttl")
+
     custom_sql_to_method = {
         "show valid_tables": "get_valid_table_names",
         "show valid_views": "get_valid_view_names",
         "select 1": "get_valid_select_one",
     }
 
-    def __init__(self, url: str, es: Elasticsearch, **kwargs: Any) -> None:
+    def __init__(
+        self,
+        url: str,
+        es: Elasticsearch,
+        columns_cache: Optional[ColumnsCacheType] = None,
+        listed_table_names: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> None:
         super().__init__(url, es, **kwargs)
         self.sql_path = kwargs.get("sql_path") or "_opendistro/_sql"
         # Opendistro SQL v2 flag
         self.v2 = kwargs.get("v2", False)
         if self.v2:
             self.fetch_size = None
+        # Flattened mappings used by SHOW VALID_COLUMNS, reused for a while
+        self.columns_cache = columns_cache if columns_cache is not None else {}
+        # Tables of the last SHOW VALID_TABLES, their columns are prefetched
+        self.listed_table_names = (
+            listed_table_names if listed_table_names is not None else []
+        )
+        self.columns_cache_ttl = float(
+            kwargs.get("columns_cache_ttl", DEFAULT_COLUMNS_CACHE_TTL)
+        )
 
     def get_valid_table_names(self) -> "Cursor":
         """
@@ -148,22 +257,86 @@ class Cursor(BaseCursor):
         https://github.com/preset-io/elasticsearch-dbapi/issues/38
         """
         results = self.execute("SHOW TABLES LIKE %")
-        response = self.es.cat.indices(format="json")
-
-        _results = []
-        for result in results:
-            is_empty = False
-            for item in response:
-                # Third column is TABLE_NAME
-                if item["index"] == result[2]:
-                    if int(item["docs.count"]) == 0:
-                        is_empty = True
-                        break
-            if not is_empty:
-                _results.append(result)
-        self._results = _results
+        # Only the columns needed to find empty indices
+        response = self.es.cat.indices(format="json", h="index,docs.count")
+        # docs.count is returned as a string, no need to parse it
+        empty_indices = {
+            item["index"] for item in response if item["docs.count"] == "0"
+        }
+        # Third column is TABLE_NAME
+        rows = [result for result in results if result[2] not in empty_indices]
+        self._set_results(rows, len(rows))
+        # Reflection may follow up with SHOW VALID_COLUMNS for each table
+        self.listed_table_names[:] = [result[2] for result in rows]
         return self
 
+    def _get_cached_columns(
+        self, index_name: str, now: float
+    ) -> Optional[List[Tuple[str, ...]]]:
+        cached = self.columns_cache.get(index_name)
+        if cached is None or now - cached[0] >= self.columns_cache_ttl:
+            return None
+        return cached[1]
+
+    def _prefetch_columns(self, table_name: str, now: float) -> None:
+        """
+        On the first SHOW VALID_COLUMNS of a listed table, fetches the mappings
+        of the next listed tables too, up to `_MAX_MAPPINGS_PREFETCH`
+
+        :param table_name: The table SHOW VALID_COLUMNS was called for
+        :param now: The current monotonic time
+        """
+        listed_table_names = self.listed_table_names
+        try:
+            idx = listed_table_names.index(table_name)
+        except ValueError:
+            return
+        # Reflection goes through tables in listing order, start with the next ones
+        following = listed_table_names[idx:] + listed_table_names[:idx]
+        index_names = [table_name]
+        length = len(table_name)
+        for index_name in following[1:]:
+            if len(index_names) >= _MAX_MAPPINGS_PREFETCH:
+                break
+            if self._get_cached_columns(index_name, now) is not None:
+                continue
+            # Plus the comma
+            length += len(index_name) + 1
+            if length > _MAX_MAPPINGS_INDEXES_LENGTH:
+                break
+            index_names.append(index_name)
+        # A single table is left to a plain request
+        if len(index_names) > 1:
+            self.get_all_mappings(index_names)
+
+    def get_all_mappings(self, index_names: List[str]) -> None:
+        """
+        Fetches the index mappings with a single request and caches the
+        flattened columns of the given indexes, so that following
+        "SHOW VALID_COLUMNS FROM <INDEX>" don't need a request each.
+        This is just an optimization, errors are ignored
+
+        :param index_names: The indexes to cache columns for
+        """
+        if not index_names:
+            return
+        try:
+            response = self.es.indices.get_mapping(
+                index=",".join(index_names), format="json"
+            )
+        except TransportError:
+            return
+        now = time.monotonic()
+        for index_name in index_names:
+            # Aliases are keyed by their indexes, left to SHOW VALID_COLUMNS
+            if index_name not in response:
+                continue
+            properties = response[index_name]["mappings"].get("properties", {})
+            self.columns_cache[index_name] = (
+                now,
+                self._traverse_mapping(properties, []),
+            )
+
     def get_valid_view_names(self) -> "Cursor":
         """
         Custom for "SHOW VALID_VIEWS" excludes empty indices from the response
@@ -172,17 +345,10 @@ class Cursor(BaseCursor):
         if self.v2:
             # On v2 an alias is represented has a table
             return self
-        response = self.es.cat.aliases(format="json")
-        results: List[Tuple[str, ...]] = []
-        for item in response:
-            results.append((item["alias"], item["index"]))
-        self.description = get_description_from_columns(
-            [
-                {"name": "VIEW_NAME", "type": "text"},
-                {"name": "TABLE_NAME", "type": "text"},
-            ]
-        )
-        self._results = results
+        response = self.es.cat.aliases(format="json", h="alias,index")
+        results = [(item["alias"], item["index"]) for item in response]
+        self.description = _VIEW_NAMES_DESCRIPTION
+        self._set_results(results, len(results))
         return self
 
     def _traverse_mapping(
@@ -197,25 +363,41 @@ class Cursor(BaseCursor):
 
         :param mapping: An elastic search mapping
         :param results: A list of fields and types
-        :param parent_field_name: recursively append
-        child field names to parent field names
+        :param parent_field_name: prepended to the mapping field names
         :return: A flattened list of fields and types
         """
-        for field_name, metadata in mapping.items():
-            if parent_field_name:
-                field_name = f"{parent_field_name}.{field_name}"
+        append = results.append
+        skip_keywords = self.v2
+        prefix = parent_field_name + "." if parent_field_name else ""
+        # Fields left to visit, last one first, leaves are just appended
+        stack: List[Tuple[str, Dict[str, Any], bool]] = [
+            (prefix + field_name, metadata, False)
+            for field_name, metadata in reversed(list(mapping.items()))
+        ]
+        while stack:
+            field_name, metadata, is_leaf = stack.pop()
+            if is_leaf:
+                append((field_name, metadata["type"]))
+                continue
+            sub_fields = []
+            for sub_field_name, sub_metadata in metadata.get("fields", {}).items():
+                # V2 does not recognize keyword fields
+                if skip_keywords and sub_field_name.endswith("keyword"):
+                    continue
+                sub_fields.append((field_name + "." + sub_field_name, sub_metadata))
             if "properties" in metadata:
-                self._traverse_mapping(metadata["properties"], results, field_name)
+                # Children go first, then this field's sub fields
+                for sub_field_name, sub_metadata in reversed(sub_fields):
+                    stack.append((sub_field_name, sub_metadata, True))
+                child_prefix = field_name + "."
+                for child_name, child_metadata in reversed(
+                    list(metadata["properties"].items())
+                ):
+                    stack.append((child_prefix + child_name, child_metadata, False))
             else:
-                results.append((field_name, metadata["type"]))
-            if "fields" in metadata:
-                for sub_field_name, sub_metadata in metadata["fields"].items():
-                    # V2 does not recognize keyword fields
-                    if sub_field_name.endswith("keyword") and self.v2:
-                        continue
-                    results.append(
-                        (f"{field_name}.{sub_field_name}", sub_metadata["type"])
-                    )
+                append((field_name, metadata["type"]))
+                for sub_field_name, sub_metadata in sub_fields:
+                    append((sub_field_name, sub_metadata["type"]))
         return results
 
     def get_valid_columns(self, index_name: str) -> "Cursor":
@@ -226,22 +408,33 @@ class Cursor(BaseCursor):
 
         https://github.com/preset-io/elasticsearch-dbapi/issues/38
         """
-        response = self.es.indices.get_mapping(index=index_name, format="json")
-        # When the index is an alias the first key is the real index name
-        try:
-            index_real_name = list(response.keys())[0]
-        except IndexError:
-            raise exceptions.DataError("Index mapping returned and unexpected response")
-        self._results = self._traverse_mapping(
-            response[index_real_name]["mappings"]["properties"], []
-        )
+        now = time.monotonic()
+        columns = self._get_cached_columns(index_name, now)
+        if columns is None:
+            self._prefetch_columns(index_name, now)
+            columns = self._get_cached_columns(index_name, now)
+        if columns is None:
+            response = self.es.indices.get_mapping(index=index_name, format="json")
+            # When the index is an alias the keys are the real index names
+            index_mappings = iter(response.values())
+            index_mapping = next(index_mappings, None)
+            if index_mapping is None:
+                raise exceptions.DataError(
+                    "Index mapping returned and unexpected response"
+                )
+            properties = index_mapping["mappings"].get("properties", {})
+            if len(response) > 1:
+                # An alias over many indexes has the fields of all of them
+                properties = dict(properties)
+                for index_mapping in index_mappings:
+                    _merge_properties(
+                        properties, index_mapping["mappings"].get("properties", {})
+                    )
+            columns = self._traverse_mapping(properties, [])
+            self.columns_cache[index_name] = (now, columns)
+        self._set_results(columns, len(columns))
 
-        self.description = get_description_from_columns(
-            [
-                {"name": "COLUMN_NAME", "type": "text"},
-                {"name": "TYPE_NAME", "type": "text"},
-            ]
-        )
+        self.description = _COLUMNS_DESCRIPTION
         return self
 
     def get_valid_select_one(self) -> "Cursor":
@@ -258,8 +451,8 @@ class Cursor(BaseCursor):
             raise exceptions.DatabaseError("Connection failed")
         if not res:
             raise exceptions.DatabaseError("Connection failed")
-        self._results = [(1,)]
-        self.description = get_description_from_columns([{"name": "1", "type": "long"}])
+        self._set_results([(1,)], 1)
+        self.description = _SELECT_ONE_DESCRIPTION
         return self
 
     @check_closed
@@ -270,26 +463,29 @@ class Cursor(BaseCursor):
         if cursor:
             return cursor
 
-        re_table_name = re.match("SHOW VALID_COLUMNS FROM (.*)", operation)
-        if re_table_name:
-            return self.get_valid_columns(re_table_name[1])
+        # Plain queries skip the regex altogether
+        if operation.startswith(_SHOW_VALID_COLUMNS):
+            re_table_name = _SHOW_VALID_COLUMNS_RE.match(operation)
+            if re_table_name:
+                return self.get_valid_columns(re_table_name[1])
 
         query = apply_parameters(operation, parameters)
         results = self.elastic_query(query)
 
-        rows = [tuple(row) for row in results.get("datarows", [])]
+        rows = results.get("datarows") or ()
         columns = results.get("schema")
         if not columns:
             raise exceptions.DataError(
                 "Missing columns field, maybe it's an elastic sql ep"
             )
-        self._results = rows
+        # Rows are converted to tuples as they are fetched
+        self._set_results(map(tuple, rows), len(rows))
         self.description = get_description_from_columns(columns)
         return self
 
     def sanitize_query(self, query: str) -> str:
-        query = query.replace('"', "")
-        query = query.replace("  ", " ")
-        query = query.replace("\n", " ")
-        # remove dummy schema from queries
-        return query.replace(f"FROM {DEFAULT_SCHEMA}.", "FROM ")
+        """
+        Removes double quotes, new lines, repeated spaces and the
+        dummy schema from queries
+        """
+        return _SANITIZE_RE.sub(_sanitize_sub, query.translate(_SANITIZE_TRANS))
@@ -30,6 +30,7 @@ class ESDialect(basesqlalchemy.BaseESDialect):
     name = "odelasticsearch"
     scheme = "http"
     driver = "rest"
+    supports_statement_cache = True
     statement_compiler = ESCompiler
     type_compiler = ESTypeCompiler
     preparer = ESTypeIdentifierPreparer
@@ -38,6 +39,7 @@ class ESDialect(basesqlalchemy.BaseESDialect):
     def dbapi(cls) -> ModuleType:
         return es.opendistro
 
+    @basesqlalchemy.reflection_cache
     def get_table_names(
         self, connection: Connection, schema: Optional[str] = None, **kwargs: Any
     ) -> List[str]:
@@ -47,6 +49,7 @@ class ESDialect(basesqlalchemy.BaseESDialect):
         # return a list of table names exclude hidden and empty indexes
         return [table.TABLE_NAME for table in result if table.TABLE_NAME[0] != "."]
 
+    @basesqlalchemy.reflection_cache
     def get_view_names(
         self, connection: Connection, schema: Optional[str] = None, **kwargs: Any
     ) -> List[str]:
@@ -56,6 +59,7 @@ class ESDialect(basesqlalchemy.BaseESDialect):
         # return a list of table names exclude hidden and empty indexes
         return [table.VIEW_NAME for table in result if table.VIEW_NAME[0] != "."]
 
+    @basesqlalchemy.reflection_cache
     def get_columns(
         self,
         connection: Connection,
@@ -67,16 +71,22 @@ class ESDialect(basesqlalchemy.BaseESDialect):
         query = f"SHOW VALID_COLUMNS FROM {table_name}"
 
         result = connection.execute(query)
-        return [
-            {
-                "name": row.COLUMN_NAME,
-                "type": basesqlalchemy.get_type(row.TYPE_NAME),
-                "nullable": True,
-                "default": None,
-            }
-            for row in result
-            if row.TYPE_NAME not in self._not_supported_column_types
-        ]
+        get_type = basesqlalchemy.get_type
+        not_supported_column_types = self._not_supported_column_types
+        columns = []
+        for row in result:
+            type_name = row.TYPE_NAME
+            if type_name in not_supported_column_types:
+                continue
+            columns.append(
+                {
+                    "name": row.COLUMN_NAME,
+                    "type": get_type(type_name),
+                    "nullable": True,
+                    "default": None,
+                }
+            )
+        return columns
 
 
 ESHTTPDialect = ESDialect
@@ -85,5 +95,5 @@ ESHTTPDialect = ESDialect
 class ESHTTPSDialect(ESDialect):
 
     scheme = "https"
-    default_paramstyle = "pyformat"
-    _not_supported_column_types = ["nested", "geo_point", "alias"]
+    supports_statement_cache = True
+    _not_supported_column_types = frozenset(("nested", "geo_point", "alias"))
@@ -1,12 +1,29 @@
+import functools
 import json
 import os
 from typing import Any, Dict, Optional
 
 from elasticsearch import Elasticsearch
 from elasticsearch.exceptions import NotFoundError
+from elasticsearch.helpers import bulk
+from es.baseapi import DEFAULT_CLIENT_KWARGS
 
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None  # type: ignore
 
-flights_columns = [
+
+FIXTURES_DIR = os.path.dirname(os.path.abspath(__file__))
+FLIGHTS_PATH = os.path.join(FIXTURES_DIR, "flights.json")
+DATA1_PATH = os.path.join(FIXTURES_DIR, "data1.json")
+DATA1_MAPPINGS_PATH = os.path.join(FIXTURES_DIR, "data1_mappings.json")
+
+# Index settings used while importing fixture files
+IMPORT_INDEX_SETTINGS = {"refresh_interval": "-1", "translog.durability": "async"}
+
+# Expected reflected columns, in order
+flights_columns = (
     "AvgTicketPrice",
     "Cancelled",
     "Carrier",
@@ -55,9 +72,9 @@ flights_columns = [
     "OriginWeather.keyword",
     "dayOfWeek",
     "timestamp",
-]
+)
 
-data1_columns = [
+data1_columns = (
     "field_boolean",
     "field_float",
     "field_nested.c1",
@@ -68,25 +85,52 @@ data1_columns = [
     "field_str.keyword",
     "location",
     "timestamp",
-]
+)
+
+
+def load_json(path: str) -> Any:
+    """
+    Loads a JSON fixture file, with orjson when it's installed
+    """
+    if orjson is None:
+        with open(path, "r") as fd:
+            return json.load(fd)
+    with open(path, "rb") as fd:
+        return orjson.loads(fd.read())
+
+
+@functools.lru_cache(maxsize=4)
+def get_client(base_url: str) -> Elasticsearch:
+    """
+    Returns an Elasticsearch client for the url, shared by all fixture helpers
+    """
+    # Documents are serialized with orjson as well when it's installed,
+    # and bulk bodies are gzipped, documents repeat the same field names
+    return Elasticsearch(
+        base_url, verify_certs=False, http_compress=True, **DEFAULT_CLIENT_KWARGS
+    )
 
 
 def import_file_to_es(
     base_url: str, data_path: str, index_name: str, mappings_path: Optional[str] = None
 ) -> None:
 
-    with open(data_path, "r") as fd_data:
-        data = json.load(fd_data)
-
-    mappings = None
-    if mappings_path:
-        with open(mappings_path, "r") as fd_mappings:
-            mappings = json.load(fd_mappings)
+    data = load_json(data_path)
+    mappings = load_json(mappings_path) if mappings_path else None
 
     set_index_settings(base_url, index_name, mappings=mappings)
-    es = Elasticsearch(base_url, verify_certs=False)
-    for doc in data:
-        es.index(index=index_name, doc_type="_doc", body=doc, refresh=True)
+    es = get_client(base_url)
+    # Bulk requests and one refresh instead of a request and refresh per doc,
+    # periodic refreshes and translog syncs per request are disabled while indexing
+    es.indices.put_settings(index=index_name, body=IMPORT_INDEX_SETTINGS)
+    try:
+        bulk(es, ({"_index": index_name, "_source": doc} for doc in data))
+    finally:
+        # Back to the default settings
+        es.indices.put_settings(
+            index=index_name, body=dict.fromkeys(IMPORT_INDEX_SETTINGS)
+        )
+    es.indices.refresh(index=index_name)
 
 
 def set_index_settings(
@@ -99,44 +143,38 @@ def set_index_settings(
     body = {"settings": {"number_of_shards": 1, "number_of_replicas": 0}}
     if mappings:
         body.update(mappings)
-    es = Elasticsearch(base_url, verify_certs=False)
+    es = get_client(base_url)
     es.indices.create(index=index_name, ignore=400, body=body)
 
 
 def delete_index(base_url, index_name: str) -> None:
-    es = Elasticsearch(base_url, verify_certs=False)
-    try:
-        es.delete_by_query(index=index_name, body={"query": {"match_all": {}}})
-    except NotFoundError:
-        return
-
-
-def delete_alias(base_url, alias_name: str, index_name: str) -> None:
-    es = Elasticsearch(base_url, verify_certs=False)
-    try:
-        es.indices.delete_alias(index=index_name, name=alias_name)
-    except NotFoundError:
-        return
+    # Dropping the index is far cheaper than deleting its documents,
+    # imports create it again
+    es = get_client(base_url)
+    es.indices.delete(index=index_name, ignore=[404])
 
 
 def create_alias(base_url, alias_name: str, index_name: str) -> None:
-    es = Elasticsearch(base_url, verify_certs=False)
+    """
+    Points alias_name to index_name only, moving it from any other index
+    in the same request
+    """
+    es = get_client(base_url)
+    actions = [{"add": {"index": index_name, "alias": alias_name}}]
+    if es.indices.exists_alias(name=alias_name):
+        actions.insert(0, {"remove": {"index": "*", "alias": alias_name}})
     try:
-        es.indices.put_alias(index=index_name, name=alias_name)
+        es.indices.update_aliases(body={"actions": actions})
     except NotFoundError:
         return
 
 
 def import_flights(base_url: str) -> None:
-    path = os.path.join(os.path.dirname(__file__), "flights.json")
-    import_file_to_es(base_url, path, "flights")
+    import_file_to_es(base_url, FLIGHTS_PATH, "flights")
 
 
 def import_data1(base_url: str) -> None:
-    data_path = os.path.join(os.path.dirname(__file__), "data1.json")
-    mappings_path = os.path.join(os.path.dirname(__file__), "data1_mappings.json")
-
-    import_file_to_es(base_url, data_path, "data1", mappings_path=mappings_path)
+    import_file_to_es(base_url, DATA1_PATH, "data1", mappings_path=DATA1_MAPPINGS_PATH)
 
 
 def import_empty_index(base_url):
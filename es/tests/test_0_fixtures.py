@@ -1,35 +1,61 @@
+from concurrent.futures import ThreadPoolExecutor
 import os
+from typing import Callable
 import unittest
 
+import pytest
+
 from .fixtures.fixtures import (
     create_alias,
-    delete_alias,
     delete_index,
+    get_client,
     import_data1,
     import_empty_index,
     import_flights,
 )
 
-BASE_URL = "http://localhost:9200"
+BASE_URL = os.environ.get("ES_URI", "http://localhost:9200")
+
+
+def reimport_index(
+    base_url: str, index_name: str, import_func: Callable[[str], None]
+) -> None:
+    delete_index(base_url, index_name)
+    import_func(base_url)
 
 
+@pytest.mark.integration
 class TestData(unittest.TestCase):
-    def setUp(self):
-        self.base_url = os.environ.get("ES_URI", BASE_URL)
+    base_url = BASE_URL
+
+    @classmethod
+    def setUpClass(cls):
+        # Indices are independent, import them concurrently
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            futures = [
+                executor.submit(reimport_index, cls.base_url, index_name, import_func)
+                for index_name, import_func in (
+                    ("flights", import_flights),
+                    ("data1", import_data1),
+                    ("empty_index", import_empty_index),
+                )
+            ]
+            for future in futures:
+                future.result()
+        create_alias(cls.base_url, "alias_to_data1", "data1")
 
     def test_1_data_flights(self):
-        delete_index(self.base_url, "flights")
-        import_flights(self.base_url)
+        self.assertTrue(get_client(self.base_url).indices.exists(index="flights"))
 
     def test_2_data_data1(self):
-        delete_index(self.base_url, "data1")
-        import_data1(self.base_url)
+        self.assertTrue(get_client(self.base_url).indices.exists(index="data1"))
 
     def test_3_data_empty_index(self):
-        delete_index(self.base_url, "empty_index")
-        import_empty_index(self.base_url)
+        self.assertTrue(get_client(self.base_url).indices.exists(index="empty_index"))
 
     def test_4_alias_to_data1(self):
-        alias_name = "alias_to_data1"
-        delete_alias(self.base_url, alias_name, "data1")
-        create_alias(self.base_url, alias_name, "data1")
+        self.assertTrue(
+            get_client(self.base_url).indices.exists_alias(
+                name="alias_to_data1", index="data1"
+            )
+        )
@@ -1,10 +1,38 @@
+from decimal import Decimal
+import math
 import os
+import random
 import unittest
 from unittest.mock import patch
 
-from es.elastic.api import connect as elastic_connect, Type
-from es.exceptions import Error, NotSupportedError, OperationalError, ProgrammingError
-from es.opendistro.api import connect as open_connect
+from elasticsearch.exceptions import SerializationError
+from elasticsearch.serializer import JSONSerializer
+from es.baseapi import (
+    _es_clients,
+    DEFAULT_CLIENT_KWARGS,
+    MAX_CUSTOM_SQL_LENGTH,
+    ORJSONSerializer,
+    reset_es_clients,
+)
+from es.elastic.api import (
+    connect as elastic_connect,
+    Cursor as ElasticCursor,
+    Type,
+)
+from es.exceptions import (
+    DataError,
+    Error,
+    NotSupportedError,
+    OperationalError,
+    ProgrammingError,
+)
+from es.opendistro.api import connect as open_connect, Cursor as OpenCursor
+import pytest
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None  # type: ignore
 
 
 def convert_bool(value: str) -> bool:
@@ -12,42 +40,52 @@ def convert_bool(value: str) -> bool:
 
 
 class TestDBAPI(unittest.TestCase):
-    def setUp(self):
-        self.driver_name = os.environ.get("ES_DRIVER", "elasticsearch")
-        self.host = os.environ.get("ES_HOST", "localhost")
-        self.port = int(os.environ.get("ES_PORT", 9200))
-        self.scheme = os.environ.get("ES_SCHEME", "http")
-        self.verify_certs = os.environ.get("ES_VERIFY_CERTS", False)
-        self.user = os.environ.get("ES_USER", None)
-        self.password = os.environ.get("ES_PASSWORD", None)
-        self.v2 = bool(os.environ.get("ES_V2", False))
-        self.support_datetime_parse = convert_bool(
+    @classmethod
+    def setUpClass(cls):
+        cls.driver_name = os.environ.get("ES_DRIVER", "elasticsearch")
+        cls.host = os.environ.get("ES_HOST", "localhost")
+        cls.port = int(os.environ.get("ES_PORT", 9200))
+        cls.scheme = os.environ.get("ES_SCHEME", "http")
+        cls.verify_certs = os.environ.get("ES_VERIFY_CERTS", False)
+        cls.user = os.environ.get("ES_USER", None)
+        cls.password = os.environ.get("ES_PASSWORD", None)
+        cls.v2 = bool(os.environ.get("ES_V2", False))
+        cls.support_datetime_parse = convert_bool(
             os.environ.get("ES_SUPPORT_DATETIME_PARSE", "True")
         )
 
-        if self.driver_name == "elasticsearch":
-            self.connect_func = elastic_connect
+        if cls.driver_name == "elasticsearch":
+            cls.connect_func = staticmethod(elastic_connect)
         else:
-            self.connect_func = open_connect
-        self.conn = self.connect_func(
-            host=self.host,
-            port=self.port,
-            scheme=self.scheme,
-            verify_certs=self.verify_certs,
-            user=self.user,
-            password=self.password,
-            v2=self.v2,
+            cls.connect_func = staticmethod(open_connect)
+        # Tests share one connection, each one gets its own cursor
+        cls.conn = cls.connect_func(
+            host=cls.host,
+            port=cls.port,
+            scheme=cls.scheme,
+            verify_certs=cls.verify_certs,
+            user=cls.user,
+            password=cls.password,
+            v2=cls.v2,
         )
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.conn.close()
+
+    def setUp(self):
         self.cursor = self.conn.cursor()
 
     def tearDown(self):
-        self.conn.close()
+        if not self.cursor.closed:
+            self.cursor.close()
 
     def test_connect_failed(self):
         """
         DBAPI: Test connection failed
         """
-        conn = self.connect_func(host="unknown")
+        # Fail fast, without retrying or waiting on the default timeout
+        conn = self.connect_func(host="unknown", timeout=1, max_retries=0)
         curs = conn.cursor()
         with self.assertRaises(OperationalError):
             curs.execute("select Carrier from flights").fetchall()
@@ -62,6 +100,7 @@ class TestDBAPI(unittest.TestCase):
         with self.assertRaises(Error):
             conn.close()
 
+    @pytest.mark.integration
     def test_execute_fetchall(self):
         """
         DBAPI: Test execute and fetchall
@@ -69,12 +108,14 @@ class TestDBAPI(unittest.TestCase):
         rows = self.cursor.execute("select Carrier from flights").fetchall()
         self.assertEqual(len(rows), 31)
 
+    @pytest.mark.integration
     def test_execute_on_connect(self):
         """
         DBAPI: Test execute, fetchall on connect
         """
-        rows = self.conn.execute("select Carrier from flights").fetchall()
-        self.assertEqual(len(rows), 31)
+        # test_execute_fetchall already checks the full result
+        rows = self.conn.execute("select Carrier from flights LIMIT 1").fetchall()
+        self.assertEqual(len(rows), 1)
 
     def test_commit_executes(self):
         """
@@ -89,98 +130,97 @@ class TestDBAPI(unittest.TestCase):
         with self.assertRaises(NotSupportedError):
             self.cursor.executemany("select Carrier from flights")
 
+    @pytest.mark.integration
     def test_execute_fetchmany(self):
         """
         DBAPI: Test execute and fectchmany
         """
         rows = self.cursor.execute("select Carrier from flights").fetchmany(2)
-        self.assertEquals(len(rows), 2)
+        self.assertEqual(len(rows), 2)
 
+    @pytest.mark.integration
     def test_execute_fetchone(self):
         """
         DBAPI: Test execute and fectchone
         """
         rows = self.cursor.execute("select Carrier from flights").fetchone()
-        self.assertEquals(len(rows), 1)
+        self.assertEqual(len(rows), 1)
 
+    @pytest.mark.integration
     def test_execute_empty_results(self):
         """
         DBAPI: Test execute query with no results
         """
-        rows = self.cursor.execute(
+        cursor = self.cursor.execute(
             "select Carrier from flights where Carrier='NORESULT'"
-        ).fetchall()
-        self.assertEquals(len(rows), 0)
-
-        count = self.cursor.execute(
-            "select Carrier from flights where Carrier='NORESULT'"
-        ).rowcount
-        self.assertEquals(count, 0)
+        )
+        # rowcount is known before fetching, no need for a second query
+        self.assertEqual(cursor.rowcount, 0)
+        self.assertEqual(len(cursor.fetchall()), 0)
 
+    @pytest.mark.integration
     def test_execute_rowcount(self):
         """
         DBAPI: Test execute and rowcount
         """
         count = self.cursor.execute("select Carrier from flights LIMIT 10").rowcount
-        self.assertEquals(count, 10)
+        self.assertEqual(count, 10)
 
+    @pytest.mark.integration
     def test_execute_wrong_table(self):
         """
         DBAPI: Test execute select with wrong table
         """
         with self.assertRaises(ProgrammingError):
-            self.cursor.execute("select Carrier from no_table LIMIT 10").rowcount
+            self.cursor.execute("select Carrier from no_table LIMIT 10")
 
-    def test_execute_select_all(self):
+    @pytest.mark.integration
+    def test_execute_select_shape(self):
         """
-        DBAPI: Test execute select all (*)
+        DBAPI: Test execute select returns a list of tuples
         """
-        rows = self.cursor.execute("select * from flights LIMIT 10").fetchall()
+        rows = self.cursor.execute(
+            "select Carrier, DestCountry from flights LIMIT 10"
+        ).fetchall()
         # Make sure we have a list of tuples
-        self.assertEqual(type(rows), type(list()))
-        self.assertEqual(type(rows[0]), type(tuple()))
-        self.assertEquals(len(rows), 10)
-
-    def test_boolean_description(self):
-        """
-        DBAPI: Test boolean description
-        """
-        rows = self.cursor.execute("select Cancelled from flights LIMIT 1")
-        self.assertEquals(
-            rows.description,
-            [("Cancelled", Type.BOOLEAN, None, None, None, None, True)],
-        )
+        self.assertIsInstance(rows, list)
+        self.assertIsInstance(rows[0], tuple)
+        self.assertEqual(len(rows), 10)
 
-    def test_number_description(self):
+    @pytest.mark.integration
+    def test_execute_star_expansion(self):
         """
-        DBAPI: Test number description
-        """
-        rows = self.cursor.execute("select FlightDelayMin from flights LIMIT 1")
-        self.assertEquals(
-            rows.description,
-            [("FlightDelayMin", Type.NUMBER, None, None, None, None, True)],
-        )
-
-    def test_string_description(self):
-        """
-        DBAPI: Test string description
+        DBAPI: Test execute select all (*)
         """
-        rows = self.cursor.execute("select DestCountry from flights LIMIT 1")
-        self.assertEquals(
-            rows.description,
-            [("DestCountry", Type.STRING, None, None, None, None, True)],
-        )
+        cursor = self.cursor.execute("select * from flights LIMIT 1")
+        rows = cursor.fetchall()
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(len(rows[0]), len(cursor.description))
 
-    def test_datetime_description(self):
+    @pytest.mark.integration
+    def test_descriptions(self):
         """
-        DBAPI: Test datetime description
+        DBAPI: Test boolean, number, string and datetime descriptions
         """
-        rows = self.cursor.execute("select timestamp from flights LIMIT 1")
-        self.assertEquals(
-            rows.description,
-            [("timestamp", Type.DATETIME, None, None, None, None, True)],
+        # One query describes every type, instead of one round trip per type
+        rows = self.cursor.execute(
+            "select Cancelled, FlightDelayMin, DestCountry, timestamp "
+            "from flights LIMIT 1"
         )
-
+        descriptions = {row.name: row for row in rows.description}
+        for column_name, column_type in (
+            ("Cancelled", Type.BOOLEAN),
+            ("FlightDelayMin", Type.NUMBER),
+            ("DestCountry", Type.STRING),
+            ("timestamp", Type.DATETIME),
+        ):
+            with self.subTest(column_name=column_name):
+                self.assertEqual(
+                    descriptions[column_name],
+                    (column_name, column_type, None, None, None, None, True),
+                )
+
+    @pytest.mark.integration
     def test_simple_group_by(self):
         """
         DBAPI: Test simple group by
@@ -201,12 +241,17 @@ class TestDBAPI(unittest.TestCase):
         """
         DBAPI: test Elasticsearch is called with user password
         """
+        # Mocked clients are not initialised, don't share or keep them
+        reset_es_clients()
+        self.addCleanup(reset_es_clients)
         mock_elasticsearch.return_value = None
         self.connect_func(
             host="localhost", scheme="http", port=9200, user="user", password="password"
         )
         mock_elasticsearch.assert_called_once_with(
-            "http://localhost:9200/", http_auth=("user", "password")
+            "http://localhost:9200/",
+            http_auth=("user", "password"),
+            **DEFAULT_CLIENT_KWARGS,
         )
 
     @patch("elasticsearch.Elasticsearch.__init__")
@@ -214,6 +259,9 @@ class TestDBAPI(unittest.TestCase):
         """
         DBAPI: test Elasticsearch is called with https
         """
+        # Mocked clients are not initialised, don't share or keep them
+        reset_es_clients()
+        self.addCleanup(reset_es_clients)
         mock_elasticsearch.return_value = None
         self.connect_func(
             host="localhost",
@@ -223,9 +271,54 @@ class TestDBAPI(unittest.TestCase):
             port=9200,
         )
         mock_elasticsearch.assert_called_once_with(
-            "https://localhost:9200/", http_auth=("user", "password")
+            "https://localhost:9200/",
+            http_auth=("user", "password"),
+            **DEFAULT_CLIENT_KWARGS,
         )
 
+    def test_shared_client(self):
+        """
+        DBAPI: test connections with the same parameters share the same client
+        """
+        conn1 = self.connect_func(host="localhost", port=9200, scheme="http")
+        conn2 = self.connect_func(host="localhost", port=9200, scheme="http")
+        conn3 = self.connect_func(host="localhost", port=9201, scheme="http")
+        self.assertIs(conn1.es, conn2.es)
+        self.assertIsNot(conn1.es, conn3.es)
+
+    def test_shared_client_credentials(self):
+        """
+        DBAPI: test shared clients are not looked up by credentials in the clear
+        """
+        reset_es_clients()
+        self.addCleanup(reset_es_clients)
+        kwargs = dict(host="localhost", port=9200, scheme="http", user="user")
+        conn1 = self.connect_func(password="secret_x", **kwargs)
+        conn2 = self.connect_func(password="secret_x", **kwargs)
+        conn3 = self.connect_func(password="secret_y", **kwargs)
+        self.assertIs(conn1.es, conn2.es)
+        self.assertIsNot(conn1.es, conn3.es)
+        self.assertNotIn("secret_x", repr(list(_es_clients.keys())))
+
+    @unittest.skipIf(orjson is None, "orjson is not installed")
+    def test_orjson_serializer(self):
+        """
+        DBAPI: test orjson serializer is used by default and round trips
+        """
+        serializer = DEFAULT_CLIENT_KWARGS["serializer"]
+        self.assertIsInstance(serializer, ORJSONSerializer)
+        payload = {"query": "SELECT * FROM flights", "fetch_size": 10}
+        self.assertEqual(serializer.loads(serializer.dumps(payload)), payload)
+        self.assertEqual(serializer.dumps("already serialized"), "already serialized")
+        with self.assertRaises(SerializationError):
+            serializer.loads("{")
+        # What orjson rejects is left to the standard serializer
+        json_serializer = JSONSerializer()
+        for data in ({1: "a"}, {"big": 2**64}, {"price": Decimal("1.5")}):
+            self.assertEqual(serializer.dumps(data), json_serializer.dumps(data))
+        self.assertTrue(math.isnan(serializer.loads('{"a": NaN}')["a"]))
+
+    @pytest.mark.integration
     def test_simple_search_with_time_zone(self):
         """
         DBAPI: Test simple search with time zone
@@ -258,6 +351,7 @@ class TestDBAPI(unittest.TestCase):
         rows = cursor.execute(sql).fetchall()
         self.assertEqual(len(rows), 3)
 
+    @pytest.mark.integration
     def test_simple_search_without_time_zone(self):
         """
         DBAPI: Test simple search without time zone
@@ -284,3 +378,278 @@ class TestDBAPI(unittest.TestCase):
 
         rows = cursor.execute(sql).fetchall()
         self.assertEqual(len(rows), 0)
+
+    def test_custom_sql_length(self):
+        """
+        DBAPI: test custom SQL commands are short enough to be dispatched
+        """
+        for cursor_class in (ElasticCursor, OpenCursor):
+            for command in cursor_class.custom_sql_to_method:
+                self.assertLessEqual(len(command), MAX_CUSTOM_SQL_LENGTH)
+
+    def test_fetch_streamed_rows(self):
+        """
+        DBAPI: Test fetch methods consume result rows as they are requested
+        """
+        conn = open_connect(host="localhost")
+        response = {
+            "schema": [{"name": "a", "type": "long"}],
+            "datarows": [[1], [2], [3], [4]],
+        }
+        cursor = conn.cursor()
+        with patch.object(OpenCursor, "elastic_query", return_value=response):
+            cursor.execute("SELECT a FROM data1")
+        self.assertEqual(cursor.rowcount, 4)
+        self.assertEqual(cursor.fetchone(), (1,))
+        self.assertEqual(cursor.fetchmany(2), [(2,), (3,)])
+        self.assertEqual(cursor.fetchall(), [(4,)])
+        self.assertIsNone(cursor.fetchone())
+        self.assertEqual(cursor.fetchall(), [])
+        self.assertEqual(cursor.rowcount, 4)
+        conn.close()
+
+    def test_elastic_array_columns_cache(self):
+        """
+        DBAPI: Test elastic SHOW ARRAY_COLUMNS batches listed tables
+        """
+        conn = elastic_connect(host="localhost")
+        tables = {
+            "columns": [
+                {"name": "name", "type": "keyword"},
+                {"name": "type", "type": "keyword"},
+            ],
+            "rows": [
+                ["data1", "TABLE"],
+                ["empty_index", "TABLE"],
+                ["no_index", "TABLE"],
+                ["alias_to_data1", "VIEW"],
+            ],
+        }
+        response = {
+            "responses": [
+                {"hits": {"hits": [{"_source": {"a": [1, 2], "b": 1}}]}},
+                {"hits": {"hits": []}},
+                {"error": {"type": "index_not_found_exception"}},
+            ]
+        }
+        cursor = conn.cursor()
+        with patch.object(
+            ElasticCursor, "elastic_query", return_value=tables
+        ), patch.object(conn.es.cat, "indices", return_value=[]), patch.object(
+            conn.es, "msearch", return_value=response
+        ) as mock_msearch, patch.object(
+            conn.es, "search"
+        ) as mock_search:
+            # Listing tables and views sends no extra request
+            cursor.get_valid_table_view_names("TABLE")
+            cursor.get_valid_table_view_names("VIEW")
+            mock_msearch.assert_not_called()
+
+            rows = cursor.execute("SHOW ARRAY_COLUMNS FROM data1").fetchall()
+            self.assertEqual(rows, [("a",), ("a.keyword",)])
+            query = {"size": 1, "track_total_hits": False}
+            mock_msearch.assert_called_once_with(
+                body=[
+                    {"index": "data1"},
+                    query,
+                    {"index": "empty_index"},
+                    query,
+                    {"index": "no_index"},
+                    query,
+                ]
+            )
+            rows = cursor.execute("SHOW ARRAY_COLUMNS FROM empty_index").fetchall()
+            self.assertEqual(rows, [])
+            mock_search.assert_not_called()
+            # Failed searches are not cached, nor prefetched again
+            mock_msearch.reset_mock()
+            mock_search.return_value = {"hits": {"total": {"value": 0}}}
+            cursor.execute("SHOW ARRAY_COLUMNS FROM no_index").fetchall()
+            mock_search.assert_called_once_with(index="no_index", size=1)
+            mock_msearch.assert_not_called()
+
+            # Batches are capped
+            mock_msearch.return_value = {"responses": []}
+            cursor.listed_table_names[:] = [f"index_{i:04}" for i in range(250)]
+            cursor.execute("SHOW ARRAY_COLUMNS FROM index_0000").fetchall()
+            self.assertEqual(len(mock_msearch.call_args[1]["body"]), 200)
+        conn.close()
+
+    def test_opendistro_sanitize_query(self):
+        """
+        DBAPI: Test opendistro query sanitize
+        """
+        cursor = OpenCursor("http://localhost:9200/", None)
+        query = 'SELECT "Carrier"  FROM "default"."flights"\nWHERE  "Carrier" = 1'
+        self.assertEqual(
+            cursor.sanitize_query(query),
+            "SELECT Carrier FROM flights WHERE Carrier = 1",
+        )
+        # Spaces are collapsed before the schema is removed
+        self.assertEqual(
+            cursor.sanitize_query("SELECT Carrier FROM  default.flights"),
+            "SELECT Carrier FROM flights",
+        )
+
+        def replace_chain(query: str) -> str:
+            query = query.replace('"', "")
+            query = query.replace("  ", " ")
+            query = query.replace("\n", " ")
+            return query.replace("FROM default.", "FROM ")
+
+        # Same results as the plain replace chain
+        tokens = ['"', " ", "  ", "\n", "FROM", "default", ".", "x"]
+        rand = random.Random(0)
+        for _ in range(5000):
+            query = "".join(rand.choices(tokens, k=rand.randint(1, 12)))
+            self.assertEqual(cursor.sanitize_query(query), replace_chain(query))
+
+    def test_opendistro_columns_cache(self):
+        """
+        DBAPI: Test opendistro SHOW VALID_COLUMNS reuses the index mapping
+        """
+        conn = open_connect(host="localhost")
+        mapping = {
+            "data1": {
+                "mappings": {
+                    "properties": {
+                        "field_str": {
+                            "type": "text",
+                            "fields": {"keyword": {"type": "keyword"}},
+                        },
+                        "field_nested": {
+                            "properties": {"c1": {"type": "long"}},
+                        },
+                    }
+                }
+            }
+        }
+        expected = [
+            ("field_str", "text"),
+            ("field_str.keyword", "keyword"),
+            ("field_nested.c1", "long"),
+        ]
+        with patch.object(
+            conn.es.indices, "get_mapping", return_value=mapping
+        ) as mock_get_mapping:
+            rows = conn.cursor().execute("SHOW VALID_COLUMNS FROM data1").fetchall()
+            self.assertEqual(rows, expected)
+            rows = conn.cursor().execute("SHOW VALID_COLUMNS FROM data1").fetchall()
+            self.assertEqual(rows, expected)
+            mock_get_mapping.assert_called_once_with(index="data1", format="json")
+        conn.close()
+
+    def test_opendistro_alias_columns(self):
+        """
+        DBAPI: Test opendistro SHOW VALID_COLUMNS merges alias index mappings
+        """
+        conn = open_connect(host="localhost")
+        mapping = {
+            "logs1": {
+                "mappings": {
+                    "properties": {
+                        "field_str": {"type": "text"},
+                        "field_nested": {"properties": {"c1": {"type": "long"}}},
+                    }
+                }
+            },
+            "logs2": {
+                "mappings": {
+                    "properties": {
+                        "field_nested": {"properties": {"c2": {"type": "keyword"}}},
+                        "field_int": {"type": "long"},
+                    }
+                }
+            },
+        }
+        with patch.object(conn.es.indices, "get_mapping", return_value=mapping):
+            rows = conn.cursor().execute("SHOW VALID_COLUMNS FROM logs").fetchall()
+        self.assertEqual(
+            rows,
+            [
+                ("field_str", "text"),
+                ("field_nested.c1", "long"),
+                ("field_nested.c2", "keyword"),
+                ("field_int", "long"),
+            ],
+        )
+        # Response mappings are left untouched
+        self.assertEqual(
+            mapping["logs1"]["mappings"]["properties"]["field_nested"],
+            {"properties": {"c1": {"type": "long"}}},
+        )
+        # An empty first index does not hide the fields of the others
+        mapping = {"logs0": {"mappings": {}}, **mapping}
+        with patch.object(conn.es.indices, "get_mapping", return_value=mapping):
+            rows = conn.cursor().execute("SHOW VALID_COLUMNS FROM logs0").fetchall()
+        self.assertEqual(
+            rows,
+            [
+                ("field_str", "text"),
+                ("field_nested.c1", "long"),
+                ("field_nested.c2", "keyword"),
+                ("field_int", "long"),
+            ],
+        )
+        conn.close()
+
+    def test_opendistro_get_all_mappings(self):
+        """
+        DBAPI: Test opendistro SHOW VALID_COLUMNS batches listed tables
+        """
+        conn = open_connect(host="localhost")
+        tables = {
+            "schema": [
+                {"name": "TABLE_CAT", "type": "keyword"},
+                {"name": "TABLE_SCHEM", "type": "keyword"},
+                {"name": "TABLE_NAME", "type": "keyword"},
+            ],
+            "datarows": [
+                ["docker-cluster", None, "flights"],
+                ["docker-cluster", None, "data1"],
+                ["docker-cluster", None, "empty_index"],
+            ],
+        }
+        mapping = {
+            "flights": {"mappings": {"properties": {"Carrier": {"type": "keyword"}}}},
+            "data1": {"mappings": {"properties": {"field_str": {"type": "text"}}}},
+        }
+        empty_indices = [{"index": "empty_index", "docs.count": "0"}]
+        cursor = conn.cursor()
+        with patch.object(
+            OpenCursor, "elastic_query", return_value=tables
+        ), patch.object(
+            conn.es.cat, "indices", return_value=empty_indices
+        ), patch.object(
+            conn.es.indices, "get_mapping", return_value=mapping
+        ) as mock_get_mapping:
+            # Listing tables sends no mappings request
+            rows = cursor.execute("SHOW VALID_TABLES").fetchall()
+            self.assertEqual([row[2] for row in rows], ["flights", "data1"])
+            mock_get_mapping.assert_not_called()
+
+            rows = cursor.execute("SHOW VALID_COLUMNS FROM flights").fetchall()
+            self.assertEqual(rows, [("Carrier", "keyword")])
+            rows = cursor.execute("SHOW VALID_COLUMNS FROM data1").fetchall()
+            self.assertEqual(rows, [("field_str", "text")])
+            mock_get_mapping.assert_called_once_with(
+                index="flights,data1", format="json"
+            )
+
+            # Batches are capped, and never ask for every index
+            mock_get_mapping.return_value = {}
+            cursor.listed_table_names[:] = [f"index_{i:04}" for i in range(250)]
+            mock_get_mapping.reset_mock()
+            with self.assertRaises(DataError):
+                cursor.execute("SHOW VALID_COLUMNS FROM index_0000")
+            first_call, last_call = mock_get_mapping.call_args_list
+            self.assertEqual(len(first_call[1]["index"].split(",")), 100)
+            self.assertEqual(last_call[1]["index"], "index_0000")
+
+            cursor.listed_table_names[:] = [f"{i:0300}" for i in range(20)]
+            mock_get_mapping.reset_mock()
+            with self.assertRaises(DataError):
+                cursor.execute("SHOW VALID_COLUMNS FROM " + "0" * 300)
+            first_call = mock_get_mapping.call_args_list[0]
+            self.assertLessEqual(len(first_call[1]["index"]), 2048)
+        conn.close()
@@ -1,18 +1,45 @@
 import os
-from typing import List
+from typing import Dict, Iterable, List, Tuple
 import unittest
 from unittest.mock import Mock, patch
 
-from es.elastic.sqlalchemy import ESDialect as ElasticDialect
-from es.exceptions import DatabaseError
-from es.opendistro.sqlalchemy import ESDialect as OpenDistroDialect
+from es.baseapi import DEFAULT_CLIENT_KWARGS, reset_es_clients
+from es.elastic.sqlalchemy import (
+    ESDialect as ElasticDialect,
+    ESHTTPSDialect as ElasticHTTPSDialect,
+)
+from es.opendistro.sqlalchemy import (
+    ESDialect as OpenDistroDialect,
+    ESHTTPSDialect as OpenDistroHTTPSDialect,
+)
 from es.tests.fixtures.fixtures import data1_columns, flights_columns
-from sqlalchemy import func, inspect, select
-from sqlalchemy.engine import create_engine
+import pytest
+from sqlalchemy import column, func, inspect, select, table
+from sqlalchemy.engine import create_engine, Engine
 from sqlalchemy.engine.reflection import Inspector
 from sqlalchemy.engine.url import URL
 from sqlalchemy.exc import ProgrammingError
-from sqlalchemy.schema import MetaData, Table
+from sqlalchemy.schema import MetaData
+
+
+# Reflected metadata, keyed by engine and reflected indices
+_META_CACHE: Dict[Tuple[int, Tuple[str, ...]], MetaData] = {}
+
+
+def _cached_meta(engine: Engine, indices: Tuple[str, ...]) -> MetaData:
+    """
+    Reflect only the given indices, once per engine
+
+    :param engine: The engine to reflect from
+    :param indices: Indices (tables) to reflect
+    :return: The reflected metadata
+    """
+    key = (id(engine), indices)
+    if key not in _META_CACHE:
+        metadata = MetaData()
+        metadata.reflect(bind=engine, only=list(indices))
+        _META_CACHE[key] = metadata
+    return _META_CACHE[key]
 
 
 class MockCredentials:
@@ -22,42 +49,55 @@ class MockCredentials:
         self.token = token
 
 
+@pytest.mark.integration
 class TestSQLAlchemy(unittest.TestCase):
-    def setUp(self):
-        self.driver_name = os.environ.get("ES_DRIVER", "elasticsearch")
+    v2: bool
+
+    @classmethod
+    def setUpClass(cls):
+        cls.driver_name = os.environ.get("ES_DRIVER", "elasticsearch")
         host = os.environ.get("ES_HOST", "localhost")
         port = int(os.environ.get("ES_PORT", 9200))
         scheme = os.environ.get("ES_SCHEME", "http")
         verify_certs = os.environ.get("ES_VERIFY_CERTS", "False")
         user = os.environ.get("ES_USER", None)
         password = os.environ.get("ES_PASSWORD", None)
-        self.v2 = bool(os.environ.get("ES_V2", False))
+        cls.v2 = bool(os.environ.get("ES_V2", False))
 
         uri = URL(
-            f"{self.driver_name}+{scheme}",
+            f"{cls.driver_name}+{scheme}",
             user,
             password,
             host,
             port,
             None,
-            {"verify_certs": str(verify_certs), "v2": self.v2},
+            {"verify_certs": str(verify_certs), "v2": cls.v2},
         )
-        self.engine = create_engine(uri)
-        self.connection = self.engine.connect()
-        self.table_flights = Table("flights", MetaData(bind=self.engine), autoload=True)
+        # Tests share the engine and connection,
+        # tests that need a different engine build their own
+        cls.engine = create_engine(uri)
+        cls.connection = cls.engine.connect()
+        # Column order is part of the reflection contract, keep a list
+        cls.expected_flights_columns = cls.make_columns_compliant(flights_columns)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.connection.close()
+        cls.engine.dispose()
 
-    def make_columns_compliant(self, columns: List[str]) -> List[str]:
+    @classmethod
+    def make_columns_compliant(cls, columns: Iterable[str]) -> List[str]:
         """
         Opendistro v1 and v2 return a different list of columns.
         keyword fields are not recognised on v2.
 
-        :param columns: A List of column names
+        :param columns: Column names
         :return: A list of expected column names for a certain opendistro version
         """
         return [
             column
             for column in columns
-            if self.v2 and not column.endswith(".keyword") or not self.v2
+            if cls.v2 and not column.endswith(".keyword") or not cls.v2
         ]
 
     def test_simple_query(self):
@@ -72,14 +112,13 @@ class TestSQLAlchemy(unittest.TestCase):
         SQLAlchemy: Test execute select with wrong table
         """
         with self.assertRaises(ProgrammingError):
-            self.connection.execute("select Carrier from no_table LIMIT 10").fetchall()
+            self.connection.execute("select Carrier from no_table LIMIT 10")
 
     def test_reflection_get_tables(self):
         """
         SQLAlchemy: Test reflection get_tables
         """
-        metadata = MetaData()
-        metadata.reflect(bind=self.engine)
+        metadata = _cached_meta(self.engine, ("flights",))
         tables = [str(table) for table in metadata.sorted_tables]
         self.assertIn("flights", tables)
 
@@ -100,10 +139,9 @@ class TestSQLAlchemy(unittest.TestCase):
         """
         SQLAlchemy: Test get_columns
         """
-        metadata = MetaData()
-        metadata.reflect(bind=self.engine)
+        metadata = _cached_meta(self.engine, ("flights",))
         source_cols = [c.name for c in metadata.tables["flights"].c]
-        self.assertEqual(self.make_columns_compliant(flights_columns), source_cols)
+        self.assertEqual(self.expected_flights_columns, source_cols)
 
     def test_get_columns_exclude_arrays(self):
         """
@@ -111,10 +149,9 @@ class TestSQLAlchemy(unittest.TestCase):
         """
         if self.driver_name == "odelasticsearch":
             return
-        metadata = MetaData()
-        metadata.reflect(bind=self.engine)
+        metadata = _cached_meta(self.engine, ("data1",))
         source_cols = [c.name for c in metadata.tables["data1"].c]
-        self.assertEqual(data1_columns, source_cols)
+        self.assertEqual(list(data1_columns), source_cols)
 
     def test_get_view_names(self):
         """
@@ -145,8 +182,7 @@ class TestSQLAlchemy(unittest.TestCase):
         """
         if self.driver_name == "elasticsearch":
             return
-        metadata = MetaData()
-        metadata.reflect(bind=self.engine)
+        metadata = _cached_meta(self.engine, ("data1",))
         source_cols = [c.name for c in metadata.tables["data1"].c]
         expected_columns = [
             "field_array",
@@ -167,10 +203,47 @@ class TestSQLAlchemy(unittest.TestCase):
         """
         SQLAlchemy: Test select all
         """
-        count = select([func.count("*")], from_obj=self.table_flights).scalar()
+        # A lightweight table clause, counting needs no reflected columns
+        count = self.connection.execute(
+            select([func.count("*")]).select_from(table("flights"))
+        ).scalar()
         # insert data delays let's assert we have something there
         self.assertGreater(count, 1)
 
+    def test_ping(self):
+        conn = self.engine.raw_connection()
+        self.assertTrue(self.engine.dialect.do_ping(conn))
+
+    def test_opendistro_ping_failed(self):
+        if self.driver_name != "odelasticsearch":
+            return
+        from elasticsearch.exceptions import ConnectionError
+
+        with patch("elasticsearch.Elasticsearch.ping") as mock_ping:
+            mock_ping.side_effect = ConnectionError()
+            conn = self.engine.raw_connection()
+            self.assertFalse(self.engine.dialect.do_ping(conn))
+
+
+class TestConnectionArgs(unittest.TestCase):
+    """
+    Elasticsearch construction is mocked, these tests need no cluster
+    """
+
+    driver_name = os.environ.get("ES_DRIVER", "elasticsearch")
+
+    def setUp(self):
+        # Mocked clients are not initialised, don't share or keep them
+        reset_es_clients()
+        self.addCleanup(reset_es_clients)
+        # Guard against any request slipping through to the network
+        patcher = patch("elasticsearch.transport.Transport.perform_request")
+        self.perform_request = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.perform_request.assert_not_called()
+
     @patch("elasticsearch.Elasticsearch.__init__")
     def test_auth(self, mock_elasticsearch):
         """
@@ -182,34 +255,34 @@ class TestSQLAlchemy(unittest.TestCase):
         )
         self.connection = self.engine.connect()
         mock_elasticsearch.assert_called_once_with(
-            "http://localhost:9200/", http_auth=("user", "password")
+            "http://localhost:9200/",
+            http_auth=("user", "password"),
+            **DEFAULT_CLIENT_KWARGS,
         )
 
+    # Skipped before patching, so AWS packages are only imported for opendistro
+    @unittest.skipUnless(driver_name == "odelasticsearch", "opendistro only")
     @patch("requests_aws4auth.AWS4Auth.__init__")
     def test_opendistro_aws_auth(self, mock_aws4auth):
         """
         SQLAlchemy: test Elasticsearch is called AWS4Auth
         """
-        if self.driver_name == "odelasticsearch":
-
-            mock_aws4auth.return_value = None
-            self.engine = create_engine(
-                "odelasticsearch+http://aws_access_key_x:aws_secret_key_y@"
-                "localhost:9200/?aws_keys=1&aws_region=us-west-2"
-            )
-            self.connection = self.engine.connect()
-            mock_aws4auth.assert_called_once_with(
-                "aws_access_key_x", "aws_secret_key_y", "us-west-2", "es"
-            )
+        mock_aws4auth.return_value = None
+        self.engine = create_engine(
+            "odelasticsearch+http://aws_access_key_x:aws_secret_key_y@"
+            "localhost:9200/?aws_keys=1&aws_region=us-west-2"
+        )
+        self.connection = self.engine.connect()
+        mock_aws4auth.assert_called_once_with(
+            "aws_access_key_x", "aws_secret_key_y", "us-west-2", "es"
+        )
 
+    @unittest.skipUnless(driver_name == "odelasticsearch", "opendistro only")
     @patch("requests_aws4auth.AWS4Auth.__init__")
     def test_opendistro_aws_profile(self, mock_aws4auth):
         """
         SQLAlchemy: test Elasticsearch is called AWS4Auth
         """
-        if self.driver_name != "odelasticsearch":
-            return
-
         from boto3.session import Session
 
         mock_get_credentials = Session.get_credentials = Mock()
@@ -242,7 +315,9 @@ class TestSQLAlchemy(unittest.TestCase):
         )
         self.connection = self.engine.connect()
         mock_elasticsearch.assert_called_once_with(
-            "https://localhost:9200/", http_auth=("user", "password")
+            "https://localhost:9200/",
+            http_auth=("user", "password"),
+            **DEFAULT_CLIENT_KWARGS,
         )
 
     @patch("elasticsearch.Elasticsearch.__init__")
@@ -258,7 +333,10 @@ class TestSQLAlchemy(unittest.TestCase):
         )
         self.connection = self.engine.connect()
         mock_elasticsearch.assert_called_once_with(
-            "https://localhost:9200/", verify_certs=False, use_ssl=False
+            "https://localhost:9200/",
+            verify_certs=False,
+            use_ssl=False,
+            **DEFAULT_CLIENT_KWARGS,
         )
 
     @patch("elasticsearch.Elasticsearch.__init__")
@@ -272,8 +350,15 @@ class TestSQLAlchemy(unittest.TestCase):
             "?http_compress=True&maxsize=100&timeout=3"
         )
         self.connection = self.engine.connect()
+        # maxsize on the URI overrides the default one
         mock_elasticsearch.assert_called_once_with(
-            "http://localhost:9200/", http_compress=True, maxsize=100, timeout=3
+            "http://localhost:9200/",
+            **{
+                **DEFAULT_CLIENT_KWARGS,
+                "http_compress": True,
+                "maxsize": 100,
+                "timeout": 3,
+            },
         )
 
     @patch("elasticsearch.Elasticsearch.__init__")
@@ -311,22 +396,24 @@ class TestSQLAlchemy(unittest.TestCase):
             sniff_timeout=4,
             max_retries=10,
             retry_on_timeout=True,
+            **DEFAULT_CLIENT_KWARGS,
         )
 
-    def test_ping(self):
-        conn = self.engine.raw_connection()
-        self.engine.dialect.do_ping(conn)
-
-    def test_opendistro_ping_failed(self):
-        if self.driver_name != "odelasticsearch":
-            return
-        from elasticsearch.exceptions import ConnectionError
-
-        with patch("elasticsearch.Elasticsearch.ping") as mock_ping:
-            mock_ping.side_effect = ConnectionError()
-            conn = self.engine.raw_connection()
-            with self.assertRaises(DatabaseError):
-                self.engine.dialect.do_ping(conn)
+    @patch("elasticsearch.Elasticsearch.__init__")
+    def test_shared_client_across_engines(self, mock_elasticsearch):
+        """
+        SQLAlchemy: test engines with the same URL share the same client
+        """
+        mock_elasticsearch.return_value = None
+        uri = "elasticsearch+http://localhost:9200/?timeout=7"
+        engine1 = create_engine(uri)
+        engine2 = create_engine(uri)
+        conn1 = engine1.raw_connection()
+        conn2 = engine2.raw_connection()
+        mock_elasticsearch.assert_called_once_with(
+            "http://localhost:9200/", timeout=7, **DEFAULT_CLIENT_KWARGS
+        )
+        self.assertIs(conn1.connection.es, conn2.connection.es)
 
 
 class TestQuote(unittest.TestCase):
@@ -345,3 +432,148 @@ class TestQuote(unittest.TestCase):
             OpenDistroDialect.preparer(dialect=OpenDistroDialect()).quote("DATE(123)")
             == "`DATE(123)`"
         )
+
+
+class TestReflectionCache(unittest.TestCase):
+    """
+    Test reflection results are cached by the dialects.
+    """
+
+    def test_get_table_names(self) -> None:
+        dialect = ElasticDialect()
+        connection = Mock()
+        connection.execute.return_value = [Mock()]
+        connection.execute.return_value[0].name = "flights"
+        self.assertEqual(dialect.get_table_names(connection), ["flights"])
+        self.assertEqual(dialect.get_table_names(connection), ["flights"])
+        connection.execute.assert_called_once_with("SHOW VALID_TABLES")
+
+    def test_ttl(self) -> None:
+        dialect = OpenDistroDialect(reflection_cache_ttl=0)
+        connection = Mock()
+        connection.execute.return_value = []
+        dialect.get_view_names(connection)
+        dialect.get_view_names(connection)
+        self.assertEqual(connection.execute.call_count, 2)
+
+    def test_expired_entries_dropped(self) -> None:
+        dialect = OpenDistroDialect()
+        connection = Mock()
+        connection.execute.return_value = []
+        with patch("time.monotonic", return_value=0):
+            dialect.get_columns(connection, "flights")
+            dialect.get_columns(connection, "logs")
+        with patch("time.monotonic", return_value=30):
+            dialect.get_view_names(connection)
+        self.assertEqual(len(dialect._reflection_cache), 3)
+        with patch("time.monotonic", return_value=60):
+            dialect.get_columns(connection, "data1")
+        self.assertEqual(len(dialect._reflection_cache), 2)
+
+    def test_get_columns(self) -> None:
+        dialect = OpenDistroDialect()
+        connection = Mock()
+        connection.execute.return_value = [
+            Mock(COLUMN_NAME="Carrier", TYPE_NAME="keyword"),
+            Mock(COLUMN_NAME="field_nested", TYPE_NAME="nested"),
+            Mock(COLUMN_NAME="timestamp", TYPE_NAME="date"),
+        ]
+        columns = dialect.get_columns(connection, "flights")
+        self.assertEqual(
+            [column["name"] for column in columns], ["Carrier", "timestamp"]
+        )
+        connection.execute.assert_called_once_with("SHOW VALID_COLUMNS FROM flights")
+
+    def test_has_table(self) -> None:
+        dialect = ElasticDialect()
+        connection = Mock()
+        connection.connection.es.indices.exists.return_value = False
+        self.assertFalse(dialect.has_table(connection, "no_table"))
+        connection.execute.assert_not_called()
+
+        connection.connection.es.indices.exists.return_value = True
+        connection.execute.return_value = [Mock()]
+        connection.execute.return_value[0].name = "flights"
+        self.assertTrue(dialect.has_table(connection, "flights"))
+        self.assertFalse(dialect.has_table(connection, "empty_index"))
+        connection.execute.assert_called_once_with("SHOW VALID_TABLES")
+
+    def test_reset(self) -> None:
+        dialect = OpenDistroDialect()
+        connection = Mock()
+        connection.execute.return_value = []
+        dialect.get_view_names(connection)
+        dialect.reset_reflection_cache()
+        dialect.get_view_names(connection)
+        self.assertEqual(connection.execute.call_count, 2)
+
+
+class TestPing(unittest.TestCase):
+    """
+    Test the dialects ping the cluster without running SQL.
+    """
+
+    def test_do_ping(self) -> None:
+        for dialect in (ElasticDialect(), OpenDistroDialect()):
+            dbapi_connection = Mock()
+            dbapi_connection.es.ping.return_value = True
+            self.assertTrue(dialect.do_ping(dbapi_connection))
+            dbapi_connection.es.ping.assert_called_once_with()
+            dbapi_connection.cursor.assert_not_called()
+
+    def test_do_ping_failed(self) -> None:
+        from elasticsearch.exceptions import ConnectionError
+
+        for dialect in (ElasticDialect(), OpenDistroDialect()):
+            dbapi_connection = Mock()
+            dbapi_connection.es.ping.side_effect = ConnectionError()
+            self.assertFalse(dialect.do_ping(dbapi_connection))
+            dbapi_connection.es.ping.side_effect = None
+            dbapi_connection.es.ping.return_value = False
+            self.assertFalse(dialect.do_ping(dbapi_connection))
+
+
+class TestGetType(unittest.TestCase):
+    """
+    Test Elasticsearch types map to SQLAlchemy types.
+    """
+
+    def test_unknown_type_warns_every_time(self) -> None:
+        from sqlalchemy import types
+
+        from es.basesqlalchemy import get_type
+
+        self.assertIs(get_type("keyword"), types.String)
+        with self.assertLogs("es.basesqlalchemy", level="WARNING") as logs:
+            self.assertIs(get_type("dense_vector"), types.String)
+            self.assertIs(get_type("dense_vector"), types.String)
+        self.assertEqual(len(logs.records), 2)
+
+
+class TestStatementCache(unittest.TestCase):
+    """
+    Test the dialects support SQLAlchemy compiled statements cache.
+    """
+
+    def test_statement_cache(self) -> None:
+        for dialect_class in (
+            ElasticDialect,
+            ElasticHTTPSDialect,
+            OpenDistroDialect,
+            OpenDistroHTTPSDialect,
+        ):
+            self.assertTrue(dialect_class()._supports_statement_cache)
+
+    def test_compile_leaves_statement_untouched(self) -> None:
+        flights = table("flights", column("Carrier"))
+        query = (
+            select([func.count().label("count"), flights.c.Carrier])
+            .group_by(flights.c.Carrier)
+            .order_by(flights.c.Carrier)
+            .limit(10)
+        )
+        for dialect_class in (ElasticDialect, OpenDistroDialect):
+            cache_key = query._generate_cache_key()
+            compiled = str(query.compile(dialect=dialect_class()))
+            self.assertEqual(query._generate_cache_key(), cache_key)
+            self.assertEqual(str(query.compile(dialect=dialect_class())), compiled)
@@ -29,7 +29,10 @@ setup(
         ]
     },
     install_requires=["elasticsearch>7, <7.14", "packaging>=21.0", "sqlalchemy"],
-    extras_require={"opendistro": ["requests_aws4auth", "boto3"]},
+    extras_require={
+        "opendistro": ["requests_aws4auth", "boto3"],
+        "orjson": ["orjson"],
+    },
     author="Preset Inc.",
     author_email="daniel@preset.io",
     url="http://preset.io",
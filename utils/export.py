@@ -3,14 +3,46 @@
 import json
 import requests
 
+try:
+    import orjson
+except ImportError:
+    orjson = None  # type: ignore
+
 index = "kibana_sample_data_flights"
 headers = {"Content-Type": "application/json"}
 base_url = "http://localhost:9200"
-url = f"{base_url}/{index}/_search?size=100"
+url = f"{base_url}/{index}/_search?scroll=1m"
+scroll_url = f"{base_url}/_search/scroll"
 file_path = "kibana_sample_data_flights.json"
-r = requests.get(url, headers=headers)
-data = [doc["_source"] for doc in r.json()["hits"]["hits"]]
+# Documents per scroll page
+page_size = 1000
+
+
+def loads(content: bytes):
+    # orjson parses the raw bytes, no need to decode them first
+    return orjson.loads(content) if orjson else json.loads(content)
+
+
+def dumps(doc) -> str:
+    return orjson.dumps(doc).decode() if orjson else json.dumps(doc)
+
 
-fd = open(file_path, "w")
-json.dump(data, fd)
-fd.close()
+# Scroll through all documents, writing each page as it arrives,
+# the file is still a JSON list of documents, like the test fixtures
+session = requests.Session()
+session.headers.update(headers)
+response = loads(session.post(url, json={"size": page_size}).content)
+separator = ""
+with open(file_path, "w") as fd:
+    fd.write("[")
+    while response["hits"]["hits"]:
+        for doc in response["hits"]["hits"]:
+            fd.write(separator + dumps(doc["_source"]))
+            separator = ","
+        response = loads(
+            session.post(
+                scroll_url, json={"scroll": "1m", "scroll_id": response["_scroll_id"]}
+            ).content
+        )
+    fd.write("]")
+session.delete(scroll_url, json={"scroll_id": response["_scroll_id"]})